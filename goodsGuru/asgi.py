@@ -2,6 +2,8 @@
 ASGI config for goodsGuru project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn goodsGuru.asgi:application``) so the
+live events stream at /events/ holds a coroutine instead of a worker thread per dashboard.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
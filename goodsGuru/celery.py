@@ -0,0 +1,16 @@
+"""
+Celery config for goodsGuru project.
+
+Workers are started with ``celery -A goodsGuru worker -B`` against the CELERY_BROKER_URL broker.
+Set CELERY_TASK_ALWAYS_EAGER=True to run the tasks in-process when developing without a worker.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'goodsGuru.settings')
+
+app = Celery('goodsGuru')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
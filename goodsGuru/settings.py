@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 
+from celery.schedules import crontab
 from decouple import config
 
 from inventory.templatetags import custom_filters
@@ -45,12 +46,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'inventory.middleware.StaticAssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory.middleware.QueryBudgetMiddleware',
+    'inventory.middleware.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'goodsGuru.urls'
@@ -68,6 +72,26 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 EMAIL_DEBUG = config('EMAIL_DEBUG', default=True, cast=bool)
 
+# Celery settings
+# Deployments need a real broker and a worker (celery -A goodsGuru worker -B), tasks queued on the in-memory
+# default are never run. For local development without a worker set CELERY_TASK_ALWAYS_EAGER=True, which runs
+# them in the web process instead.
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='memory://')
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'sweep-expiring-lots': {
+        'task': 'inventory.tasks.sweep_expiring_lots',
+        'schedule': crontab(hour=6, minute=0),
+    },
+    'prune-notifications': {
+        'task': 'inventory.tasks.prune_notifications',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
+
 
 TEMPLATES = [
     {
@@ -88,6 +112,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'goodsGuru.wsgi.application'
+ASGI_APPLICATION = 'goodsGuru.asgi.application'
 AUTH_USER_MODEL = 'inventory.InventoryUser'
 
 # Database
@@ -100,6 +125,60 @@ DATABASES = {
     }
 }
 
+# Optional read replica for the dashboard and reporting reads. Locally a second SQLite file stands in for it,
+# refreshed from the primary with `manage.py sync_replica`.
+if config('DATABASE_REPLICA_NAME', default=''):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / config('DATABASE_REPLICA_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['inventory.routers.ReportingRouter']
+INVENTORY_READ_DATABASE = 'replica' if 'replica' in DATABASES else 'default'
+# How long a browser keeps reading from the primary after a write
+INVENTORY_REPLICA_LAG_SECONDS = config('INVENTORY_REPLICA_LAG_SECONDS', default=5, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='goodsguru'),
+    }
+}
+
+# Cache used for the dashboard statistics, entries are keyed by a data version bumped from the model signals
+INVENTORY_CACHE_ALIAS = 'default'
+INVENTORY_CACHE_TIMEOUT = config('INVENTORY_CACHE_TIMEOUT', default=300, cast=int)
+
+# Listing pages, page_size in the query string is capped at the maximum
+INVENTORY_PAGE_SIZE = 25
+INVENTORY_MAX_PAGE_SIZE = 100
+
+# Minimum number of seconds between two low stock alerts for the same product
+INVENTORY_LOW_STOCK_ALERT_COOLDOWN = config('INVENTORY_LOW_STOCK_ALERT_COOLDOWN', default=6 * 60 * 60, cast=int)
+
+# Read notifications older than this many days are deleted by the nightly prune
+INVENTORY_NOTIFICATION_RETENTION_DAYS = config('INVENTORY_NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+
+# Pub/sub behind the live events stream, the in-process broker only reaches clients of the same worker
+INVENTORY_EVENTS_BACKEND = 'inventory.events.InProcessBroker'
+
+# Per request SQL instrumentation, adds X-Query-* response headers and logs requests over their budget.
+# Budgets are per URL name and also pinned by the test suite, for a logged in user with a cold cache.
+INVENTORY_QUERY_INSTRUMENTATION = config('INVENTORY_QUERY_INSTRUMENTATION', default=DEBUG, cast=bool)
+INVENTORY_QUERY_BUDGETS = {
+    'home': 12,
+    'sales': 12,
+    'products': 12,
+    'notifications': 10,
+}
+
+# Lots expiring within this many days are reported by the daily expiry sweep
+INVENTORY_EXPIRY_WARNING_DAYS = config('INVENTORY_EXPIRY_WARNING_DAYS', default=7, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -136,6 +215,27 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static'
 ]
+STATIC_ROOT = config('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))
+
+# Outside of development collectstatic bundles, fingerprints and precompresses the assets, which
+# StaticAssetMiddleware then serves with far-future cache headers unless a web server does it
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': config('STATICFILES_BACKEND', default='django.contrib.staticfiles.storage.StaticFilesStorage'
+                          if DEBUG else 'inventory.storage.BundledManifestStaticFilesStorage'),
+    },
+}
+# The pages link the bundles around the Font Awesome stylesheet, which has to stay between the base styles
+# and the theme for the theme's rules to win
+INVENTORY_STATIC_BUNDLES = {
+    'css/inventory.css': ['css/base.css', 'css/styles.css'],
+    'css/theme.css': ['css/style.min.css'],
+}
+INVENTORY_SERVE_STATIC = config('INVENTORY_SERVE_STATIC', default=not DEBUG, cast=bool)
+INVENTORY_STATIC_MAX_AGE = 60
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
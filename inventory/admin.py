@@ -1,15 +1,62 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Q
 
 from inventory.models import Supplier, Product, Stock, Purchase, Sale, InventoryUser
+from inventory.pagination import EstimatedCountPaginator
+from inventory.search import prefix_search
 
 
-# Register your models here.
+class ScalableChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        if not self.paginator.estimated:
+            # A page past the estimated end made the paginator count exactly and serve its last page instead
+            self.result_count = self.paginator.count
+            self.multi_page = self.result_count > self.list_per_page
+            self.page_num = min(self.page_num, self.paginator.num_pages)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    # Changelists for tables that grow without bound: estimated totals instead of COUNT(*) on each page,
+    # and no second count of the whole table when a filter or search is applied
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return ScalableChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # The whole term is matched as a prefix of the search fields instead of Django's per word substring match.
+        # The match is a range on LOWER(field), which the product and supplier changelists (and the autocomplete
+        # widgets, which search the same way) seek through their Lower() name index.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        condition = Q()
+        for field in self.get_search_fields(request):
+            condition |= prefix_search(field, search_term)
+        return queryset.filter(condition), False
+
+
+class LowStockFilter(admin.SimpleListFilter):
+    title = 'stock level'
+    parameter_name = 'low_stock'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Low stock')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.low_stock()
+        return queryset
+
 
 @admin.register(InventoryUser)
 class InventoryUserAdmin(admin.ModelAdmin):
     list_display = ['email', 'is_staff', 'is_active']
-    search_fields = ['email', 'is_staff', 'is_active']
-    list_filter = ['email']
+    search_fields = ['^email']
+    list_filter = ['is_staff', 'is_active']
     list_per_page = 10
     ordering = ['email']
     fieldsets = [
@@ -18,10 +65,9 @@ class InventoryUserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Supplier)
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(ScalableAdmin):
     list_display = ['name', 'contact_person', 'email']
-    search_fields = ['name', 'contact_person', 'email']
-    list_filter = ['name']
+    search_fields = ['name']
     list_per_page = 10
     ordering = ['name']
     fieldsets = [
@@ -30,10 +76,12 @@ class SupplierAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'responsible_user', 'selling_price']
-    search_fields = ['name', 'category', 'responsible_user']
-    list_filter = ['name']
+class ProductAdmin(ScalableAdmin):
+    list_display = ['name', 'category', 'responsible_user', 'selling_price', 'next_expiry']
+    list_select_related = ['responsible_user']
+    search_fields = ['name']
+    list_filter = ['category']
+    autocomplete_fields = ['responsible_user']
     list_per_page = 10
     ordering = ['name']
     fieldsets = [
@@ -42,10 +90,12 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(Stock)
-class StockAdmin(admin.ModelAdmin):
+class StockAdmin(ScalableAdmin):
     list_display = ['product', 'quantity', 'low_stock_threshold']
-    search_fields = ['product', 'quantity', 'low_stock_threshold']
-    list_filter = ['product']
+    list_select_related = ['product']
+    search_fields = ['product__name']
+    list_filter = [LowStockFilter, 'product__category']
+    autocomplete_fields = ['product']
     list_per_page = 10
     ordering = ['product']
     fieldsets = [
@@ -54,12 +104,16 @@ class StockAdmin(admin.ModelAdmin):
 
 
 @admin.register(Purchase)
-class PurchaseAdmin(admin.ModelAdmin):
-    list_display = ['product', 'supplier', 'quantity', 'acquisition_price','expiration_date', 'purchase_date']
-    search_fields = ['product', 'supplier', 'quantity', 'acquisition_price', 'purchase_date']
-    list_filter = ['product']
+class PurchaseAdmin(ScalableAdmin):
+    list_display = ['product', 'supplier', 'quantity', 'remaining_quantity', 'acquisition_price','expiration_date',
+                    'purchase_date']
+    list_select_related = ['product', 'supplier']
+    search_fields = ['product__name', 'supplier__name']
+    list_filter = ['product__category']
+    autocomplete_fields = ['product', 'supplier']
+    date_hierarchy = 'purchase_date'
     list_per_page = 10
-    ordering = ['product']
+    ordering = ['-purchase_date']
     fieldsets = [
         ('Purchase Information',
          {'fields': ['product', 'supplier', 'quantity', 'acquisition_price', 'expiration_date', 'purchase_date']}),
@@ -67,12 +121,15 @@ class PurchaseAdmin(admin.ModelAdmin):
 
 
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(ScalableAdmin):
     list_display = ['product', 'quantity', 'selling_price', 'sale_date']
-    search_fields = ['product', 'quantity', 'selling_price', 'sale_date']
-    list_filter = ['product']
+    list_select_related = ['product']
+    search_fields = ['product__name']
+    list_filter = ['product__category']
+    autocomplete_fields = ['product']
+    date_hierarchy = 'sale_date'
     list_per_page = 10
-    ordering = ['product']
+    ordering = ['-sale_date']
     fieldsets = [
         ('Sale Information', {'fields': ['product', 'quantity',  'sale_date']}),
     ]
@@ -0,0 +1,30 @@
+# inventory/alerts.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from inventory.models import Stock
+from inventory.tasks import send_low_stock_alerts
+
+
+def claim_low_stock_alerts(product_ids):
+    # Each low stock episode alerts once: the conditional update disarms the stock row, so concurrent
+    # or later sales find nothing to claim until stock added back above the threshold re-arms it
+    # (StockQuerySet.increment, admin stock edits) and the cooldown has passed
+    now = timezone.now()
+    cooldown_start = now - timedelta(seconds=getattr(settings, 'INVENTORY_LOW_STOCK_ALERT_COOLDOWN', 0))
+    armed = Stock.objects.filter(low_stock_alert_armed=True).filter(
+        Q(low_stock_alerted_at__isnull=True) | Q(low_stock_alerted_at__lte=cooldown_start)
+    )
+    return [product_id for product_id in product_ids
+            if armed.filter(product_id=product_id).update(low_stock_alert_armed=False, low_stock_alerted_at=now)]
+
+
+def queue_low_stock_alerts(product_ids):
+    # Notifications and emails go out from a task once the sale is committed, never inside the request transaction
+    product_ids = claim_low_stock_alerts(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: send_low_stock_alerts.delay(product_ids), robust=True)
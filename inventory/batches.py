@@ -0,0 +1,128 @@
+# inventory/batches.py
+from collections import defaultdict
+
+from django.contrib.admin.models import LogEntry, ADDITION
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory import summary
+from inventory.alerts import queue_low_stock_alerts
+from inventory.cache import bump_data_version, bump_user_version
+from inventory.events import publish_stock_level
+from inventory.models import Product, Purchase, Sale, SaleBatch, Stock
+
+
+def _parse_lines(lines):
+    if not isinstance(lines, list) or not lines:
+        raise ValidationError('A batch needs at least one sale line.')
+
+    parsed = []
+    errors = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            product_id = int(line['product'])
+            quantity = int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            errors.append(f'Line {number}: product and quantity must be whole numbers.')
+            continue
+        try:
+            # parse_date raises on well formed but impossible dates and on values that are not strings
+            sale_date = parse_date(line['sale_date']) if line.get('sale_date') else timezone.now().date()
+        except (TypeError, ValueError):
+            sale_date = None
+        if quantity < 1:
+            errors.append(f'Line {number}: quantity must be at least 1.')
+        elif sale_date is None:
+            errors.append(f'Line {number}: sale_date must be a YYYY-MM-DD date.')
+        else:
+            parsed.append((product_id, quantity, sale_date))
+
+    if errors:
+        raise ValidationError(errors)
+    return parsed
+
+
+def record_sale_batch(user, idempotency_key, lines):
+    # Returns (batch, created), a key that was already used returns the original batch untouched
+    batch = SaleBatch.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    if batch is not None:
+        return batch, False
+
+    parsed = _parse_lines(lines)
+    quantities = defaultdict(int)
+    for product_id, quantity, _ in parsed:
+        quantities[product_id] += quantity
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                batch = SaleBatch.objects.create(user=user, idempotency_key=idempotency_key)
+        except IntegrityError:
+            # A concurrent retry of the same upload got there first
+            return SaleBatch.objects.get(user=user, idempotency_key=idempotency_key), False
+
+        # Validate every line against the current stock in one query
+        products = Product.objects.in_bulk(quantities)
+        stock_levels = dict(Stock.objects.filter(product_id__in=quantities).values_list('product_id', 'quantity'))
+        errors = []
+        for product_id, quantity in quantities.items():
+            if product_id not in products:
+                errors.append(f'Product {product_id} does not exist.')
+            elif stock_levels.get(product_id, 0) < quantity:
+                errors.append(f'Not enough stock available for {products[product_id].name} - Quantity: {quantity}')
+        if errors:
+            raise ValidationError(errors)
+
+        # One conditional decrement per product, still guarded against sales that landed since the check
+        low_stock_product_ids = []
+        emptied_lot_product_ids = []
+        for product_id, quantity in quantities.items():
+            stock_level = Stock.objects.decrement(product_id, quantity)
+            if stock_level is None:
+                raise ValidationError(
+                    f'Not enough stock available for {products[product_id].name} - Quantity: {quantity}')
+            publish_stock_level(product_id, *stock_level)
+            remaining_stock, low_stock_threshold = stock_level
+            if remaining_stock <= low_stock_threshold:
+                low_stock_product_ids.append(product_id)
+            if Purchase.objects.consume(product_id, quantity):
+                emptied_lot_product_ids.append(product_id)
+        Product.objects.refresh_next_expiry(emptied_lot_product_ids)
+
+        sales = Sale.objects.bulk_create([
+            Sale(product=products[product_id], quantity=quantity, sale_date=sale_date,
+                 selling_price=products[product_id].selling_price * quantity)
+            for product_id, quantity, sale_date in parsed
+        ])
+
+        content_type = ContentType.objects.get_for_model(Sale)
+        action_time = timezone.now()
+        LogEntry.objects.bulk_create([
+            LogEntry(
+                user_id=user.pk,
+                content_type_id=content_type.id,
+                object_id=sale.pk,
+                object_repr=str(sale),
+                action_flag=ADDITION,
+                change_message=f'Sale added - Product: {sale.product}, Quantity: {sale.quantity}, '
+                               f'Amount: {sale.selling_price}, Batch: {idempotency_key}',
+                action_time=action_time,
+            )
+            for sale in sales
+        ])
+
+        # bulk_create skips the model signals, so do their bookkeeping here once for the whole batch
+        summary.record_sales(sales)
+        batch.sales_count = len(sales)
+        batch.total_quantity = sum(sale.quantity for sale in sales)
+        batch.total_amount = sum(sale.selling_price for sale in sales)
+        batch.save(update_fields=['sales_count', 'total_quantity', 'total_amount'])
+
+        queue_low_stock_alerts(low_stock_product_ids)
+        bump_data_version()
+        bump_user_version(user.pk)
+
+    return batch, True
@@ -0,0 +1,100 @@
+# inventory/cache.py
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DATA_VERSION_KEY = 'inventory:data_version'
+USER_VERSION_KEY = 'inventory:user_version:{user_id}'
+HITS_KEY = 'inventory:stats:hits'
+MISSES_KEY = 'inventory:stats:misses'
+
+_missing = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def _initial_version():
+    # Seed versions from the clock so an evicted counter never restarts at a value still present in the cache
+    return time.time_ns() // 1000
+
+
+def _get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def _increment_counter(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_data_version():
+    return _get_version(DATA_VERSION_KEY)
+
+
+def get_user_version(user_id):
+    return _get_version(USER_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_data_version():
+    # Bump only once the write is visible, otherwise a concurrent reader could cache stale data under the new version
+    transaction.on_commit(lambda: _bump_version(DATA_VERSION_KEY))
+
+
+def bump_user_version(user_id):
+    transaction.on_commit(lambda: _bump_version(USER_VERSION_KEY.format(user_id=user_id)))
+
+
+def get_or_compute(name, compute, user_id=None):
+    if user_id is None:
+        key = f'inventory:{get_data_version()}:{name}'
+    else:
+        key = f'inventory:user:{user_id}:{get_user_version(user_id)}:{name}'
+
+    cache = get_cache()
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        _increment_counter(HITS_KEY)
+        return value
+
+    _increment_counter(MISSES_KEY)
+    value = compute()
+    cache.set(key, value, timeout=getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300))
+    return value
+
+
+def cache_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0,
+        'data_version': get_data_version(),
+    }
+
+
+def reset_cache_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
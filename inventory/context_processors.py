@@ -1,86 +1,104 @@
 # context_processors.py
 
+import functools
 from datetime import datetime
 
 from django.contrib.admin.models import LogEntry
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Sum, F
+from django.urls import reverse
 from django.utils import timezone
 from notifications.models import Notification
 
-from inventory.models import Sale, Product, Stock
+from inventory.cache import get_or_compute
+from inventory.inbox import unread_count
+from inventory.models import Sale, Product, Stock, InventorySummary, SalesDailyRollup
+from inventory.summary import revenue_trend
+
+
+def _summary_totals():
+    summary = InventorySummary.load()
+    return {
+        'total_sales': summary.total_sales,
+        'total_revenue': round(summary.total_revenue, 2),
+        'total_stock_quantity': summary.total_stock_quantity,
+    }
+
+
+def _product_sales_percentage(today):
+    # Today's quantity sold per product against its current stock, from the rollup rows of the day
+    todays_rollups = list(SalesDailyRollup.objects.filter(date=today).select_related('product'))
+    stock_quantities = dict(
+        Stock.objects.filter(product__in={rollup.product_id for rollup in todays_rollups})
+        .values_list('product_id', 'quantity')
+    )
+    product_sales_percentage = {}
+    for rollup in todays_rollups:
+        quantity = stock_quantities.get(rollup.product_id)
+        if quantity:
+            product_sales_percentage[rollup.product] = (rollup.quantity / quantity) * 100
+    return product_sales_percentage
+
+
+def _today_sales_count(today):
+    return SalesDailyRollup.objects.filter(date=today).aggregate(total=Sum('sales_count'))['total'] or 0
 
 
 def inventory_context(request):
     if request.user.is_authenticated:
+        user = request.user
+        today = timezone.now().date()
+
+        # Templates call callables when resolving a variable, so each statistic is only looked up
+        # (once per request) by the pages that actually render it
+        def lazy(name, compute, user_id=None):
+            return functools.cache(lambda: get_or_compute(name, compute, user_id=user_id))
+
         # Notification data
-        user_notifications = Notification.objects.filter(recipient=request.user)
+        user_notifications = Notification.objects.filter(recipient=user)
         unread_notifications = user_notifications.filter(unread=True)
+        unread_notifications_count = functools.cache(lambda: unread_count(user.pk))
+        recent_notifications = lazy('recent_notifications', lambda: list(unread_notifications[:5]), user_id=user.pk)
 
-        recent_actions = LogEntry.objects.filter(user=request.user).order_by('-action_time')[:10]
+        recent_actions = lazy(
+            'recent_actions',
+            lambda: list(LogEntry.objects.filter(user=user).select_related('content_type').order_by('-action_time')[:10]),
+            user_id=user.pk,
+        )
 
         # Summary statistics
-        total_sales = Sale.objects.count()
-        total_revenue = round(Sale.objects.aggregate(total_revenue=Sum('selling_price'))['total_revenue'] or 0, 2)
+        totals = lazy('summary_totals', _summary_totals)
         low_stock_products = Product.objects.filter(stock__quantity__lte=F('stock__low_stock_threshold'))
+        low_stock_products_count = lazy('low_stock_products_count', low_stock_products.count)
         recent_sales = Sale.objects.order_by('-sale_date')[:10]
 
         # Sales trends
-        current_month_revenue = round(
-            Sale.objects.filter(sale_date__month=timezone.now().month).aggregate(total_revenue=Sum('selling_price'))[
-                'total_revenue'] or 0, 2
-        )
-        previous_month_revenue = round(
-            Sale.objects.filter(sale_date__month=timezone.now().month - 1).aggregate(
-                total_revenue=Sum('selling_price'))[
-                'total_revenue'] or 0, 2
-        )
-
-        trend = None
-        percentage_change = 0
-
-        if current_month_revenue > previous_month_revenue:
-            trend = "Up"
-            if previous_month_revenue != 0:
-                percentage_change = ((current_month_revenue - previous_month_revenue) / previous_month_revenue) * 100
-            else:
-                percentage_change = 100
-        elif current_month_revenue < previous_month_revenue:
-            trend = "Down"
-            if previous_month_revenue != 0:
-                percentage_change = ((previous_month_revenue - current_month_revenue) / previous_month_revenue) * 100
-            else:
-                percentage_change = 100
+        sales_trend = lazy(f'sales_trend:{today}', lambda: revenue_trend(today))
 
         # Today's sales
-        today_sales = Sale.objects.filter(sale_date=timezone.now().date())
-        percentage_change = round(percentage_change, 2)
-
-        # Product sales percentage
-        product_sales_percentage = {}
-        for sale in today_sales:
-            product_stock = Stock.objects.get(product=sale.product)
-            product_sales_percentage[sale.product] = (sale.quantity / product_stock.quantity) * 100
-
-        # Total stock quantity and product quantities
-        total_stock_quantity = Stock.objects.aggregate(total_quantity=Sum('quantity'))['total_quantity'] or 0
-        product_quantities = {
-            product.name: Stock.objects.filter(product=product).aggregate(total_quantity=Sum('quantity'))[
-                              'total_quantity'] or 0 for product in Product.objects.all()}
+        today_sales = Sale.objects.filter(sale_date=today)
+        today_sales_count = lazy(f'today_sales_count:{today}', lambda: _today_sales_count(today))
+        product_sales_percentage = lazy(f'product_sales_percentage:{today}', lambda: _product_sales_percentage(today))
 
         return {
             'user_notifications': user_notifications,
             'unread_notifications': unread_notifications,
-            'total_sales': total_sales,
-            'total_revenue': total_revenue,
+            'unread_notifications_count': unread_notifications_count,
+            'recent_notifications': recent_notifications,
+            'total_sales': lambda: totals()['total_sales'],
+            'total_revenue': lambda: totals()['total_revenue'],
             'low_stock_products': low_stock_products,
+            'low_stock_products_count': low_stock_products_count,
             'recent_sales': recent_sales,
             'currentYear': datetime.now().year,
-            'trend': trend,
-            'percentage_change': percentage_change,
+            'trend': lambda: sales_trend()[0],
+            'percentage_change': lambda: sales_trend()[1],
             'today_sales': today_sales,
+            'today_sales_count': today_sales_count,
             'product_sales_percentage': product_sales_percentage,
-            'total_stock_quantity': total_stock_quantity,
-            'product_quantities': product_quantities,
+            'total_stock_quantity': lambda: totals()['total_stock_quantity'],
             'resent_actions': recent_actions,
+            # Pages only subscribe to the live events stream when served by an ASGI server
+            'live_events_url': reverse('live_events') if isinstance(request, ASGIRequest) else '',
         }
     return {}
@@ -0,0 +1,116 @@
+# inventory/events.py
+import asyncio
+import json
+import threading
+from functools import cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+STOCK_CHANNEL = 'stock'
+USER_CHANNEL = 'user:{user_id}'
+
+
+class InProcessBroker:
+    # Fans events out to the subscribers of this process only, which is enough for a single ASGI worker.
+    # Deployments running several workers plug in a backend with the same publish/subscribe methods on top
+    # of a shared broker (INVENTORY_EVENTS_BACKEND).
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        # Called from the synchronous write paths, hands the event to each subscriber's event loop
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, channel, event)
+            except RuntimeError:
+                # The subscriber's loop closed before it unsubscribed
+                pass
+
+    def subscribe(self, channels):
+        return Subscription(self, channels)
+
+    def _add(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel, set())
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._subscriptions.pop(channel, None)
+
+
+class Subscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = None
+        self.queue = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.broker.queue_size)
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self)
+
+    def deliver(self, channel, event):
+        if self.queue.full():
+            # A client that cannot keep up loses its oldest events instead of growing the queue
+            self.queue.get_nowait()
+        self.queue.put_nowait((channel, event))
+
+    async def get(self):
+        return await self.queue.get()
+
+
+@cache
+def get_broker():
+    return import_string(getattr(settings, 'INVENTORY_EVENTS_BACKEND', 'inventory.events.InProcessBroker'))()
+
+
+def publish_on_commit(channel, event):
+    # Clients only hear about writes that actually committed
+    transaction.on_commit(lambda: get_broker().publish(channel, event), robust=True)
+
+
+def publish_stock_level(product_id, quantity, low_stock_threshold):
+    # Takes the (quantity, low stock threshold) pair the StockQuerySet updates return
+    publish_on_commit(STOCK_CHANNEL, {'type': 'stock', 'product': product_id, 'quantity': quantity,
+                                      'low_stock': quantity <= low_stock_threshold})
+
+
+def publish_notification(notification):
+    publish_on_commit(USER_CHANNEL.format(user_id=notification.recipient_id), {
+        'type': 'notification', 'id': notification.pk, 'verb': notification.verb,
+        'description': notification.description, 'level': notification.level,
+    })
+
+
+def format_event(event):
+    return f'event: {event["type"]}\ndata: {json.dumps(event, default=str)}\n\n'
+
+
+async def event_stream(user_id, heartbeat=15):
+    # Server-sent events for one dashboard: stock levels for everybody plus the user's own notifications.
+    # The comment lines keep proxies from closing an idle connection.
+    yield 'retry: 5000\n\n'
+    async with get_broker().subscribe([STOCK_CHANNEL, USER_CHANNEL.format(user_id=user_id)]) as subscription:
+        while True:
+            try:
+                _, event = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
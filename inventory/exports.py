@@ -0,0 +1,52 @@
+# inventory/exports.py
+import csv
+import json
+
+from inventory.models import Sale
+
+SALE_EXPORT_FIELDS = ['id', 'sale_date', 'product_id', 'product', 'category', 'quantity', 'list_price',
+                      'selling_price']
+
+
+class Echo:
+    # File-like object whose write returns the line, so csv.writer can feed a streaming response
+    def write(self, value):
+        return value
+
+
+def sales_ledger(start_date=None, end_date=None, product_id=None, category=None, chunk_size=2000, using=None):
+    sales = Sale.objects.using(using).order_by('sale_date', 'id')
+    if start_date:
+        sales = sales.filter(sale_date__gte=start_date)
+    if end_date:
+        sales = sales.filter(sale_date__lte=end_date)
+    if product_id:
+        sales = sales.filter(product_id=product_id)
+    if category:
+        sales = sales.filter(product__category=category)
+
+    # Plain tuples fetched chunk by chunk through a server-side cursor where the database supports one
+    return sales.values_list('id', 'sale_date', 'product_id', 'product__name', 'product__category', 'quantity',
+                             'product__selling_price', 'selling_price').iterator(chunk_size=chunk_size)
+
+
+def _as_text(value):
+    return '' if value is None else str(value)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SALE_EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([_as_text(value) for value in row])
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(SALE_EXPORT_FIELDS, row)), default=str) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson'),
+}
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 
 from inventory.models import Sale, Product
+from inventory.widgets import TypeaheadSelect
 
 
 class UserCreationForm(UserCreationForm):
@@ -41,7 +42,8 @@ class SaleForm(forms.ModelForm):
         model = Sale
         fields = ['product', 'quantity']
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-select mb-3 form-control', 'placeholder': 'Select a product'}),
+            'product': TypeaheadSelect('product_lookup', params={'in_stock': 1}, attrs={
+                'class': 'form-select mb-3 form-control', 'placeholder': 'Type a product name'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control mb-2 ', 'min': '1'}),
         }
 
@@ -54,6 +56,7 @@ class ProductForm(forms.ModelForm):
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter product name'}),
             'category': forms.Select(attrs={'class': 'form-select', 'placeholder': 'Select category'}),
-            'responsible_user': forms.Select(attrs={'class': 'form-select', 'placeholder': 'Select responsible user'}),
+            'responsible_user': TypeaheadSelect('user_lookup', attrs={
+                'class': 'form-select', 'placeholder': 'Type an email'}),
             'selling_price': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Enter selling price'}),
         }
@@ -0,0 +1,74 @@
+# inventory/inbox.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+from notifications.models import Notification
+
+from inventory.cache import get_cache, bump_user_version
+
+UNREAD_COUNT_KEY = 'inventory:unread_count:{user_id}'
+
+
+def unread_count(user_id):
+    # Per user counter, computed once and then moved by the write paths. It expires like the other cached
+    # statistics, so any drift from a write that missed it (a cache restart, a raw SQL update) heals itself.
+    cache = get_cache()
+    key = UNREAD_COUNT_KEY.format(user_id=user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, unread=True).count()
+        cache.add(key, count, timeout=getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300))
+    return count
+
+
+def _adjust_unread_count(user_id, delta):
+    cache = get_cache()
+    key = UNREAD_COUNT_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Not cached, the next read counts from the database
+        pass
+
+
+def adjust_unread_count(user_id, delta):
+    if delta:
+        transaction.on_commit(lambda: _adjust_unread_count(user_id, delta))
+
+
+def mark_read(user, notification_ids=None):
+    # One UPDATE scoped to the recipient, for a few notifications or all of them
+    notifications = Notification.objects.filter(recipient=user, unread=True)
+    if notification_ids is not None:
+        notifications = notifications.filter(pk__in=notification_ids)
+    with transaction.atomic():
+        updated = notifications.update(unread=False)
+        adjust_unread_count(user.pk, -updated)
+        if updated:
+            bump_user_version(user.pk)
+    return updated
+
+
+def prune_read_notifications(retention_days=None, chunk_size=5000):
+    # Deletes read notifications older than the retention window in chunks, through plain DELETE statements
+    # so a large backlog does not load every row to send delete signals. Returns the number of rows deleted.
+    if retention_days is None:
+        retention_days = getattr(settings, 'INVENTORY_NOTIFICATION_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = Notification.objects.filter(unread=False, timestamp__lt=cutoff).order_by('pk')
+    connection = connections[router.db_for_write(Notification)]
+    table = connection.ops.quote_name(Notification._meta.db_table)
+
+    deleted = 0
+    while True:
+        rows = list(expired.values_list('pk', 'recipient_id')[:chunk_size])
+        if not rows:
+            return deleted
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(rows))})',
+                           [pk for pk, _ in rows])
+            for recipient_id in {recipient_id for _, recipient_id in rows}:
+                bump_user_version(recipient_id)
+        deleted += len(rows)
@@ -0,0 +1,15 @@
+# inventory/management/arguments.py
+import argparse
+
+from django.utils.dateparse import parse_date
+
+
+def date_argument(value):
+    # argparse type for the commands' --start/--end options
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise argparse.ArgumentTypeError(f'{value} is not a YYYY-MM-DD date')
+    return date
@@ -0,0 +1,138 @@
+import json
+import platform
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from notifications.models import Notification
+
+from inventory.batches import record_sale_batch
+from inventory.cache import bump_data_version, bump_user_version, get_cache
+from inventory.inbox import UNREAD_COUNT_KEY
+from inventory.models import Product, Purchase, Sale, Stock, Supplier, User
+from inventory.querycount import count_queries
+
+VIEWS = ['home', 'sales', 'products', 'notifications', 'sales_trends']
+
+
+class Rollback(Exception):
+    pass
+
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 2),
+        'max_ms': round(timings[-1] * 1000, 2),
+        'queries': max(queries),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Time each inventory view (cold and warm cache) and the signal driven write paths against the current '
+            'database, and write the results as JSON for comparison between runs')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per view and write path')
+        parser.add_argument('--user', help='Email of the user the views are rendered for, defaults to the first '
+                                           'user with products')
+        parser.add_argument('--output', help='JSON file to write, the results are printed either way')
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        if runs < 1:
+            raise CommandError('--runs must be at least 1')
+        users = User.objects.filter(email=options['user']) if options['user'] else \
+            User.objects.filter(product__stock__quantity__gte=50).order_by('id')
+        self.user = users.first()
+        if self.user is None:
+            raise CommandError('No user to benchmark with, run seed_inventory first')
+        self.product = Product.objects.filter(responsible_user=self.user, stock__quantity__gte=50).first()
+
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'runs': runs,
+            'rows': {model.__name__: model.objects.count()
+                     for model in [User, Product, Purchase, Sale, Stock, Notification]},
+            'views': self.benchmark_views(runs),
+            'writes': self.benchmark_writes(runs),
+        }
+
+        output = json.dumps(results, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def benchmark_views(self, runs):
+        client = Client()
+        client.force_login(self.user)
+        results = {}
+        for name in VIEWS:
+            url = reverse(name)
+            for state in ['cold', 'warm']:
+                timings, queries = [], []
+                for _ in range(runs):
+                    if state == 'cold':
+                        self.expire_cached_pages()
+                    with count_queries() as counter:
+                        started = time.perf_counter()
+                        response = client.get(url)
+                        timings.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f'{url} returned {response.status_code}')
+                    queries.append(counter.count)
+                results[f'{name}:{state}'] = summarize(timings, queries)
+        return results
+
+    def expire_cached_pages(self):
+        # Moves the benchmark user to fresh cache versions rather than clearing the cache, which the running
+        # site may share (sessions, other users' fragments and counters)
+        bump_data_version()
+        bump_user_version(self.user.pk)
+        get_cache().delete(UNREAD_COUNT_KEY.format(user_id=self.user.pk))
+
+    def benchmark_writes(self, runs):
+        if self.product is None:
+            return {}
+        supplier = Supplier.objects.first()
+        product = self.product
+        writes = {
+            'sale': lambda: Sale.objects.create(product=product, quantity=1),
+            'sale_batch_20_lines': lambda: record_sale_batch(
+                self.user, uuid.uuid4().hex,
+                [{'product': product.pk, 'quantity': 1} for _ in range(20)]),
+        }
+        if supplier is not None:
+            writes['purchase'] = lambda: Purchase.objects.create(
+                product=product, supplier=supplier, quantity=10, acquisition_price=1,
+                expiration_date=timezone.now().date())
+        return {name: self.time_write(write, runs) for name, write in writes.items()}
+
+    def time_write(self, write, runs):
+        # Every write is rolled back so the benchmark leaves the data as it found it, on_commit work
+        # (alert tasks, cache version bumps) does not run and is not part of the timing
+        timings, queries = [], []
+        for _ in range(runs):
+            try:
+                with transaction.atomic():
+                    with count_queries() as counter:
+                        started = time.perf_counter()
+                        write()
+                        timings.append(time.perf_counter() - started)
+                    queries.append(counter.count)
+                    raise Rollback
+            except Rollback:
+                pass
+        return summarize(timings, queries)
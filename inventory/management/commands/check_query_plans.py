@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.contrib.admin.models import LogEntry
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from notifications.models import Notification
+
+from inventory.models import Product, Purchase, Sale, SalesDailyRollup, Stock, User
+from inventory.search import prefix_search
+
+# Plan fragments that show an index being used, per database vendor
+INDEX_MARKERS = {
+    'sqlite': ['USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'USING PRIMARY KEY'],
+    'postgresql': ['Index Scan', 'Index Only Scan', 'Bitmap Index Scan'],
+    'mysql': ['key:', "'key':", '"key":'],
+}
+
+# Plan fragments that show the index being searched with the query's conditions, rather than read from one end
+# to the other (SQLite's SCAN ... USING INDEX, a PostgreSQL index scan with only a Filter, MySQL's index type)
+SEEK_MARKERS = {
+    'sqlite': ['SEARCH '],
+    'postgresql': ['Index Cond:'],
+    'mysql': [' const ', ' eq_ref ', ' ref ', ' range '],
+}
+
+# Filtered queries that are answered by reading a whole partial index, which only holds the matching rows
+PARTIAL_INDEX_SCANS = {'low stock products'}
+
+
+def hot_queries():
+    # The query shapes the pages and signal handlers run most, with representative parameters
+    today = timezone.now().date()
+    month_ago = today - timedelta(days=30)
+    return {
+        'sales in a date range': Sale.objects.filter(sale_date__gte=month_ago, sale_date__lte=today),
+        'sales page': Sale.objects.order_by('-sale_date', '-id')[:26],
+        'sales of a product in a date range': Sale.objects.filter(product_id=1, sale_date__gte=month_ago),
+        'latest purchase of a product': Purchase.objects.filter(product_id=1).order_by('-purchase_date')[:1],
+        'open lots of a product': Purchase.objects.open_lots(1),
+        'lots expiring within a week': Purchase.objects.filter(remaining_quantity__gt=0,
+                                                               expiration_date__lte=today + timedelta(days=7)),
+        'unread notifications of a user': Notification.objects.filter(recipient_id=1, unread=True),
+        'notifications page': Notification.objects.filter(recipient_id=1).order_by('-timestamp')[:26],
+        'low stock products': Stock.objects.low_stock(),
+        'stock changed since': Stock.objects.filter(updated_at__gt=timezone.now() - timedelta(minutes=5)).order_by(
+            'updated_at', 'id')[:26],
+        'daily rollup for a month': SalesDailyRollup.objects.filter(date__gte=month_ago, date__lte=today),
+        'recent actions of a user': LogEntry.objects.filter(user_id=1).order_by('-action_time')[:10],
+        'admin purchases page': Purchase.objects.order_by('-purchase_date', '-id')[:10],
+        'admin products page': Product.objects.order_by('name', '-id')[:10],
+        'product typeahead': Product.objects.filter(prefix_search('name', 'a')).order_by(Lower('name'), 'id')[:10],
+        'user typeahead': User.objects.filter(prefix_search('email', 'a'), is_active=True).order_by(Lower('email'))[:10],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN for each hot query and fail when one of them does not use an index'
+
+    def handle(self, *args, **options):
+        markers = INDEX_MARKERS.get(connection.vendor)
+        if markers is None:
+            raise CommandError(f'No plan markers known for the {connection.vendor} backend')
+
+        failures = []
+        for name, queryset in hot_queries().items():
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    # Small development tables are cheaper to scan, make the planner show what it would do at scale
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+
+            uses_index = any(marker in plan for marker in markers)
+            # Reading an index in order is only good enough when the query has nothing to filter on,
+            # like the first page of an ordered listing
+            if uses_index and queryset.query.has_filters() and name not in PARTIAL_INDEX_SCANS:
+                uses_index = any(marker in plan for marker in SEEK_MARKERS[connection.vendor])
+            if not uses_index:
+                failures.append(name)
+            status = self.style.SUCCESS('index') if uses_index else self.style.ERROR('NO INDEX')
+            self.stdout.write(f'{status}  {name}')
+            if options['verbosity'] > 1 or not uses_index:
+                self.stdout.write(f'    {plan}'.replace('\n', '\n    '))
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries do not use an index: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from inventory.exports import EXPORT_FORMATS, sales_ledger
+from inventory.management.arguments import date_argument
+from inventory.routers import read_database
+
+
+class Command(BaseCommand):
+    help = 'Stream the sales ledger as CSV or JSONL with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--start', type=date_argument, help='First sale date to include (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date_argument, help='Last sale date to include (YYYY-MM-DD)')
+        parser.add_argument('--product', type=int, help='Only export sales of this product id')
+        parser.add_argument('--category', help='Only export sales of products in this category')
+        parser.add_argument('--output', help='File to write, defaults to stdout')
+
+    def handle(self, *args, **options):
+        stream, _ = EXPORT_FORMATS[options['format']]
+        rows = sales_ledger(start_date=options['start'], end_date=options['end'], product_id=options['product'],
+                            category=options['category'], using=read_database())
+
+        if not options['output']:
+            for chunk in stream(rows):
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in stream(rows):
+                output.write(chunk)
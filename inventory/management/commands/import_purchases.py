@@ -0,0 +1,207 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory import summary
+from inventory.cache import bump_data_version
+from inventory.events import publish_stock_level
+from inventory.models import Product, Purchase, Stock, Supplier, User
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RowError(Exception):
+    pass
+
+
+def whole_number(value):
+    # int() would truncate a JSON float such as 3.7 and accept true as 1
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{value!r} is not a whole number')
+    return int(value)
+
+
+def read_jsonl(source):
+    for line in source:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+class Command(BaseCommand):
+    help = ('Stream purchases (and any new products or suppliers they mention) from a CSV or JSONL file, '
+            'in bounded chunks with one stock update per product per chunk')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or JSONL file with one object per line')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per transaction')
+        parser.add_argument('--strict', action='store_true', help='Stop at the first invalid row')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.ndjson') else 'csv')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        # Everything needed to resolve a row is kept in memory, rows themselves are only held one chunk at a time
+        self.products = dict(Product.objects.values_list('name', 'id'))
+        self.product_ids = set(self.products.values())
+        self.suppliers = dict(Supplier.objects.values_list('name', 'id'))
+        self.supplier_ids = set(self.suppliers.values())
+        self.users = dict(User.objects.values_list('email', 'id'))
+
+        imported = skipped = 0
+        started = time.perf_counter()
+        with path.open(newline='', encoding='utf-8') as source:
+            rows = csv.DictReader(source) if file_format == 'csv' else read_jsonl(source)
+            # Rows are numbered as data rows, after the CSV header
+            line_number = 0
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                purchases = []
+                # Rows are checked in full before they create a product or supplier, and the chunk's
+                # transaction takes the new rows back out with its purchases if the import stops
+                with transaction.atomic():
+                    for row in chunk:
+                        line_number += 1
+                        try:
+                            purchases.append(self.build_purchase(row))
+                        except RowError as error:
+                            if options['strict']:
+                                raise CommandError(f'Row {line_number}: {error}')
+                            skipped += 1
+                            self.stderr.write(f'Row {line_number}: {error}')
+
+                    self.save_chunk(purchases)
+                imported += len(purchases)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{imported} purchases imported ({imported / elapsed:,.0f} rows/s)')
+
+        bump_data_version()
+        elapsed = time.perf_counter() - started
+        memory = peak_memory_mb()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} purchases, skipped {skipped} rows in {elapsed:.2f}s '
+            f'({imported / elapsed if elapsed else 0:,.0f} rows/s)'
+            + (f', peak memory {memory:.1f} MB' if memory is not None else '')
+        ))
+
+    def build_purchase(self, row):
+        if not isinstance(row, dict):
+            raise RowError('not a JSON object')
+        try:
+            quantity = whole_number(row['quantity'])
+            acquisition_price = Decimal(str(row['acquisition_price']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise RowError('quantity and acquisition_price are required numbers')
+        if quantity < 1:
+            raise RowError('quantity must be at least 1')
+
+        try:
+            expiration_date = parse_date(str(row.get('expiration_date') or ''))
+        except ValueError:  # Well formed but impossible, like 2024-02-30
+            expiration_date = None
+        if expiration_date is None:
+            raise RowError('expiration_date must be a YYYY-MM-DD date')
+        try:
+            purchase_date = parse_date(str(row['purchase_date'])) if row.get('purchase_date') else timezone.now().date()
+        except ValueError:
+            purchase_date = None
+        if purchase_date is None:
+            raise RowError('purchase_date must be a YYYY-MM-DD date')
+
+        # Both are resolved before either is created, so a rejected row never leaves a new product or supplier
+        product = self.resolve_product(row)
+        supplier = self.resolve_supplier(row)
+        return Purchase(product_id=self.create_product(product), supplier_id=self.create_supplier(supplier),
+                        quantity=quantity, remaining_quantity=quantity, acquisition_price=acquisition_price,
+                        purchase_date=purchase_date, expiration_date=expiration_date)
+
+    def resolve_product(self, row):
+        # The id of a known product, or the fields of the product to create
+        product = str(row.get('product') or '').strip()
+        if product.isdigit() and int(product) in self.product_ids:
+            return int(product)
+        if product in self.products:
+            return self.products[product]
+        if not product or not row.get('category') or not row.get('selling_price'):
+            raise RowError(f'unknown product "{product}", add category, selling_price and responsible_user '
+                           f'columns to create it')
+
+        responsible_user = self.users.get(row.get('responsible_user'))
+        if responsible_user is None:
+            raise RowError(f'unknown responsible_user "{row.get("responsible_user")}" for new product "{product}"')
+        try:
+            selling_price = Decimal(str(row['selling_price']))
+        except InvalidOperation:
+            raise RowError('selling_price must be a number')
+        return {'name': product, 'category': row['category'], 'responsible_user_id': responsible_user,
+                'selling_price': selling_price}
+
+    def create_product(self, product):
+        if not isinstance(product, dict):
+            return product
+        new_product = Product.objects.create(**product)
+        self.products[new_product.name] = new_product.pk
+        self.product_ids.add(new_product.pk)
+        return new_product.pk
+
+    def resolve_supplier(self, row):
+        # The id of a known supplier, or the fields of the supplier to create
+        supplier = str(row.get('supplier') or '').strip()
+        if supplier.isdigit() and int(supplier) in self.supplier_ids:
+            return int(supplier)
+        if supplier in self.suppliers:
+            return self.suppliers[supplier]
+        if not supplier or not row.get('supplier_email'):
+            raise RowError(f'unknown supplier "{supplier}", add a supplier_email column to create it')
+        return {'name': supplier, 'email': row['supplier_email'], 'contact_person': row.get('contact_person') or ''}
+
+    def create_supplier(self, supplier):
+        if not isinstance(supplier, dict):
+            return supplier
+        new_supplier = Supplier.objects.create(**supplier)
+        self.suppliers[new_supplier.name] = new_supplier.pk
+        self.supplier_ids.add(new_supplier.pk)
+        return new_supplier.pk
+
+    def save_chunk(self, purchases):
+        if not purchases:
+            return
+        # bulk_create skips handle_purchase, so apply the stock increments here, summed per product
+        Purchase.objects.bulk_create(purchases, batch_size=1000)
+        received = defaultdict(int)
+        for purchase in purchases:
+            received[purchase.product_id] += purchase.quantity
+        for product_id, quantity in received.items():
+            publish_stock_level(product_id, *Stock.objects.increment(product_id, quantity))
+        Product.objects.refresh_next_expiry(list(received))
+        summary.record_purchases(purchases)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.inbox import prune_read_notifications
+
+
+class Command(BaseCommand):
+    help = 'Delete read notifications older than the retention window, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.INVENTORY_NOTIFICATION_RETENTION_DAYS,
+                            help='Retention window in days, defaults to INVENTORY_NOTIFICATION_RETENTION_DAYS')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per DELETE statement')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--days cannot be negative and --chunk-size must be at least 1')
+        deleted = prune_read_notifications(options['days'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} read notifications'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.summary import rebuild_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard summary totals from the sales and stock tables'
+
+    def handle(self, *args, **options):
+        summary = rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f'Summary rebuilt: {summary.total_sales} sales, revenue {summary.total_revenue}, '
+            f'{summary.total_stock_quantity} items in stock'
+        ))
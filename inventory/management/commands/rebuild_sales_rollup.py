@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventory.management.arguments import date_argument
+from inventory.summary import rebuild_sales_rollup
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the daily sales rollup from the sales table, for a date range or everything'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date_argument, help='First sale date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date_argument, help='Last sale date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_sales_rollup(start_date=options['start'], end_date=options['end'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily rollup rows'))
@@ -0,0 +1,178 @@
+import random
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from notifications.models import Notification
+
+from inventory import summary
+from inventory.cache import bump_data_version
+from inventory.models import Product, Purchase, Sale, Stock, Supplier, User
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic users, suppliers, products, purchases, sales and notifications with bulk inserts, '
+            'reproducible with --seed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--suppliers', type=int, default=20)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--purchases', type=int, default=5000)
+        parser.add_argument('--sales', type=int, default=50000)
+        parser.add_argument('--notifications', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365, help='Spread purchases and sales over this many days')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        for name in ['users', 'suppliers', 'products', 'purchases', 'sales', 'notifications']:
+            if options[name] < 0:
+                raise CommandError(f'--{name} cannot be negative')
+        if options['products'] and not options['users'] and not User.objects.exists():
+            raise CommandError('Products need a responsible user, pass --users')
+        if options['purchases'] and not (options['products'] and options['suppliers']):
+            raise CommandError('Purchases need --products and --suppliers')
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        self.random = random.Random(options['seed'])
+        self.today = timezone.now().date()
+        self.days = options['days']
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            user_ids = self.step('users', self.create_users, options['users'])
+            supplier_ids = self.step('suppliers', self.create_suppliers, options['suppliers'])
+            product_prices = self.step('products', self.create_products, options['products'],
+                                       user_ids or list(User.objects.values_list('id', flat=True)))
+            # Lots are generated first and only inserted once the sales have taken from them
+            lots = self.generate_lots(options['purchases'], product_prices, supplier_ids)
+            stock = self.step('sales', self.create_sales, options['sales'], product_prices, lots)
+            self.step('purchases and stock', self.create_lots_and_stock, lots, stock)
+            self.step('notifications', self.create_notifications, options['notifications'], product_prices,
+                      user_ids or list(User.objects.values_list('id', flat=True)))
+
+            # Bulk inserts skip the signal handlers, rebuild what they would have maintained
+            summary.rebuild_summary()
+            summary.rebuild_sales_rollup()
+            bump_data_version()
+
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.2f}s'))
+
+    def step(self, name, create, *args):
+        started = time.perf_counter()
+        result = create(*args)
+        self.stdout.write(f'{name}: {time.perf_counter() - started:.2f}s')
+        return result
+
+    def random_date(self):
+        return self.today - timedelta(days=self.random.randrange(self.days))
+
+    def create_users(self, count):
+        # Hashing is deliberately slow, every seeded user shares the password "password"
+        password = make_password('password')
+        offset = User.objects.count()
+        users = User.objects.bulk_create([
+            User(email=f'seed{offset + number}@goodsguru.test', first_name='Seed', last_name=f'User {number}',
+                 password=password)
+            for number in range(count)
+        ], batch_size=BATCH_SIZE)
+        return [user.pk for user in users]
+
+    def create_suppliers(self, count):
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f'Supplier {number}', contact_person=f'Contact {number}',
+                     email=f'supplier{number}@goodsguru.test')
+            for number in range(count)
+        ], batch_size=BATCH_SIZE)
+        return [supplier.pk for supplier in suppliers]
+
+    def create_products(self, count, user_ids):
+        categories = [category for category, _ in Product.CATEGORY_CHOICES]
+        products = Product.objects.bulk_create([
+            Product(name=f'Product {number}', category=self.random.choice(categories),
+                    responsible_user_id=self.random.choice(user_ids),
+                    selling_price=Decimal(self.random.randrange(100, 50000)) / 100)
+            for number in range(count)
+        ], batch_size=BATCH_SIZE)
+        return {product.pk: product.selling_price for product in products}
+
+    def generate_lots(self, count, product_prices, supplier_ids):
+        product_ids = list(product_prices)
+        purchases = []
+        for _ in range(count):
+            product_id = self.random.choice(product_ids)
+            quantity = self.random.randrange(20, 200)
+            purchase_date = self.random_date()
+            purchases.append(Purchase(
+                product_id=product_id, supplier_id=self.random.choice(supplier_ids), quantity=quantity,
+                remaining_quantity=quantity, acquisition_price=product_prices[product_id] * Decimal('0.6'),
+                purchase_date=purchase_date,
+                expiration_date=purchase_date + timedelta(days=self.random.randrange(30, 720)),
+            ))
+
+        return sorted(purchases, key=lambda purchase: (purchase.expiration_date, purchase.purchase_date))
+
+    def create_sales(self, count, product_prices, lots):
+        # Sales take lots first expired first out in memory, a sale that does not fit the stock left is skipped
+        open_lots = defaultdict(deque)
+        stock = defaultdict(int)
+        for lot in lots:
+            open_lots[lot.product_id].append(lot)
+            stock[lot.product_id] += lot.quantity
+        product_ids = list(open_lots)
+        sales = []
+        for _ in range(count if product_ids else 0):
+            product_id = self.random.choice(product_ids)
+            quantity = self.random.randrange(1, 6)
+            if stock[product_id] < quantity:
+                continue
+            stock[product_id] -= quantity
+            self.consume(open_lots[product_id], quantity)
+            sales.append(Sale(product_id=product_id, quantity=quantity, sale_date=self.random_date(),
+                              selling_price=product_prices[product_id] * quantity))
+            if len(sales) == BATCH_SIZE:
+                Sale.objects.bulk_create(sales)
+                sales = []
+        Sale.objects.bulk_create(sales)
+        return stock
+
+    def consume(self, product_lots, quantity):
+        while quantity:
+            lot = product_lots[0]
+            taken = min(lot.remaining_quantity, quantity)
+            lot.remaining_quantity -= taken
+            quantity -= taken
+            if not lot.remaining_quantity:
+                product_lots.popleft()
+
+    def create_lots_and_stock(self, lots, stock):
+        Purchase.objects.bulk_create(lots, batch_size=BATCH_SIZE)
+        Stock.objects.bulk_create([Stock(product_id=product_id, quantity=quantity)
+                                   for product_id, quantity in stock.items()], batch_size=BATCH_SIZE)
+        product_ids = list(stock)
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            Product.objects.refresh_next_expiry(product_ids[start:start + BATCH_SIZE])
+
+    def create_notifications(self, count, product_prices, user_ids):
+        product_ids = list(product_prices) or list(Product.objects.values_list('id', flat=True)[:1000])
+        if not product_ids or not user_ids:
+            return
+        content_type = ContentType.objects.get_for_model(Product)
+        now = timezone.now()
+        Notification.objects.bulk_create((
+            Notification(recipient_id=self.random.choice(user_ids), actor_content_type=content_type,
+                         actor_object_id=str(self.random.choice(product_ids)), verb='Low Stock Notification',
+                         description='The stock is low. Please order more.', level='warning',
+                         unread=self.random.random() < 0.3,
+                         timestamp=now - timedelta(minutes=self.random.randrange(self.days * 24 * 60)))
+            for _ in range(count)
+        ), batch_size=BATCH_SIZE)
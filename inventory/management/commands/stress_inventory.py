@@ -0,0 +1,180 @@
+import json
+import multiprocessing
+import random
+import statistics
+import time
+
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.test import override_settings
+from django.utils import timezone
+
+from goodsGuru.celery import app as celery_app
+from inventory.models import Product, Purchase, Sale, Stock, Supplier, User
+
+MAX_RETRIES = 20
+
+
+def run_worker(worker, product_ids, supplier_id, operations, sale_ratio, seed):
+    # Runs in a forked process, which opens its own database connection on first use
+    rng = random.Random(seed + worker)
+    stats = {'sales': 0, 'sold': 0, 'rejected': 0, 'purchases': 0, 'purchased': 0, 'retries': 0, 'errors': 0,
+             'alert_emails': 0, 'sale_latencies': [], 'purchase_latencies': []}
+
+    # Low stock alerts run eagerly in the worker so they are part of the contention, their emails stay in memory.
+    # The fork has its own copy of the Celery app, so switching it to eager leaves the parent alone.
+    celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+    with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                           CELERY_TASK_ALWAYS_EAGER=True):
+        for _ in range(operations):
+            product_id = rng.choice(product_ids)
+            selling = rng.random() < sale_ratio
+            quantity = rng.randrange(1, 4) if selling else rng.randrange(5, 20)
+            started = time.perf_counter()
+            for attempt in range(MAX_RETRIES):
+                try:
+                    if selling:
+                        Sale.objects.create(product_id=product_id, quantity=quantity)
+                    else:
+                        Purchase.objects.create(product_id=product_id, supplier_id=supplier_id, quantity=quantity,
+                                                acquisition_price=1, expiration_date=timezone.now().date())
+                except ValidationError:
+                    stats['rejected'] += 1
+                    break
+                except OperationalError:
+                    # SQLite answers "database is locked" once its busy timeout runs out, back off and retry
+                    stats['retries'] += 1
+                    time.sleep(rng.uniform(0, 0.01 * 2 ** min(attempt, 6)))
+                    continue
+                latency = time.perf_counter() - started
+                if selling:
+                    stats['sales'] += 1
+                    stats['sold'] += quantity
+                    stats['sale_latencies'].append(latency)
+                else:
+                    stats['purchases'] += 1
+                    stats['purchased'] += quantity
+                    stats['purchase_latencies'].append(latency)
+                break
+            else:
+                stats['errors'] += 1
+        stats['alert_emails'] = len(getattr(mail, 'outbox', []))
+
+    connections.close_all()
+    return stats
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+
+    def at(fraction):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 2)
+
+    return {'p50_ms': at(0.5), 'p99_ms': at(0.99), 'max_ms': round(latencies[-1] * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2)}
+
+
+class Command(BaseCommand):
+    help = ('Hammer a few products with concurrent sales and purchases from several processes, report throughput, '
+            'retries and latency, and check the final stock equals purchases minus sales')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=200, help='Sales and purchases per worker')
+        parser.add_argument('--products', type=int, default=3, help='Number of contended products')
+        parser.add_argument('--initial-stock', type=int, default=100)
+        parser.add_argument('--sale-ratio', type=float, default=0.8, help='Share of operations that are sales')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Keep the stress products and their rows')
+        parser.add_argument('--output', help='JSON file to write the report to')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['operations'] < 1 or options['products'] < 1:
+            raise CommandError('--workers, --operations and --products must be at least 1')
+        if connection.vendor == 'sqlite':
+            # Readers no longer block the writer, which is what a concurrent SQLite deployment would run with
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+
+        products, supplier = self.create_products(options['products'], options['initial_stock'])
+        product_ids = [product.pk for product in products]
+        try:
+            report = self.run(product_ids, supplier.pk, options)
+        finally:
+            if not options['keep']:
+                Product.objects.filter(pk__in=product_ids).delete()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        if not report['consistent']:
+            raise CommandError('Final stock does not match purchases minus sales')
+
+    def create_products(self, count, initial_stock):
+        user, _ = User.objects.get_or_create(email='stress@goodsguru.test',
+                                             defaults={'first_name': 'Stress', 'last_name': 'Test'})
+        supplier, _ = Supplier.objects.get_or_create(name='Stress supplier',
+                                                     defaults={'contact_person': 'Stress',
+                                                               'email': 'stress-supplier@goodsguru.test'})
+        products = [Product.objects.create(name=f'Stress product {number}', category='Groceries',
+                                           responsible_user=user, selling_price=1)
+                    for number in range(count)]
+        for product in products:
+            Purchase.objects.create(product=product, supplier=supplier, quantity=initial_stock, acquisition_price=1,
+                                    expiration_date=timezone.now().date())
+        return products, supplier
+
+    def run(self, product_ids, supplier_id, options):
+        initial = dict(Stock.objects.filter(product_id__in=product_ids).values_list('product_id', 'quantity'))
+        # Forked children must not share the parent's database connection
+        connections.close_all()
+
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+            results = pool.starmap(run_worker, [
+                (worker, product_ids, supplier_id, options['operations'], options['sale_ratio'], options['seed'])
+                for worker in range(options['workers'])
+            ])
+        elapsed = time.perf_counter() - started
+
+        totals = {key: sum(result[key] for result in results)
+                  for key in ['sales', 'sold', 'rejected', 'purchases', 'purchased', 'retries', 'errors',
+                              'alert_emails']}
+        sale_latencies = [latency for result in results for latency in result['sale_latencies']]
+        purchase_latencies = [latency for result in results for latency in result['purchase_latencies']]
+
+        # Stock has to equal what it started at, plus every purchase, minus every sale, by the workers' count
+        # and by the rows actually written
+        final = dict(Stock.objects.filter(product_id__in=product_ids).values_list('product_id', 'quantity'))
+        sold = Sale.objects.filter(product_id__in=product_ids).aggregate(total=Sum('quantity'))['total'] or 0
+        purchased = Purchase.objects.filter(product_id__in=product_ids).aggregate(total=Sum('quantity'))['total']
+        remaining_in_lots = Purchase.objects.filter(product_id__in=product_ids).aggregate(
+            total=Sum('remaining_quantity'))['total']
+        expected = sum(initial.values()) + totals['purchased'] - totals['sold']
+        final_stock = sum(final.values())
+
+        return {
+            'database': connection.vendor,
+            'workers': options['workers'],
+            'operations_per_worker': options['operations'],
+            'products': len(product_ids),
+            'elapsed_s': round(elapsed, 3),
+            'sales_per_s': round(totals['sales'] / elapsed, 1),
+            'operations_per_s': round((totals['sales'] + totals['purchases']) / elapsed, 1),
+            **totals,
+            'sale_latency': percentiles(sale_latencies),
+            'purchase_latency': percentiles(purchase_latencies),
+            'final_stock': final_stock,
+            'expected_stock': expected,
+            'stock_from_rows': purchased - sold,
+            'stock_in_lots': remaining_in_lots,
+            'negative_stock': any(quantity < 0 for quantity in final.values()),
+            'consistent': final_stock == expected == purchased - sold == remaining_in_lots,
+        }
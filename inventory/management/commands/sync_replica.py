@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into the local replica stand-in (DATABASE_REPLICA_NAME), '
+            'real replicas are kept up to date by the database itself')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'INVENTORY_READ_DATABASE', DEFAULT_DB_ALIAS)
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError('No replica configured, set DATABASE_REPLICA_NAME')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite files')
+
+        started = time.perf_counter()
+        primary.ensure_connection()
+        replica.ensure_connection()
+        # SQLite's online backup copies a consistent snapshot, schema included, while the primary stays writable
+        primary.connection.backup(replica.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {primary.settings_dict["NAME"]} to {replica.settings_dict["NAME"]} '
+            f'in {time.perf_counter() - started:.2f}s'))
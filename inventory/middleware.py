@@ -0,0 +1,129 @@
+# inventory/middleware.py
+import logging
+import mimetypes
+import os
+import time
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from inventory.querycount import count_queries
+from inventory.routers import primary_reads, replica_configured
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    # Counts the SQL each request runs, adds it to the response headers and logs requests over their view's budget.
+    # Streaming responses run part of their queries after the response leaves the middleware, those are not counted.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'INVENTORY_QUERY_INSTRUMENTATION', False):
+            return self.get_response(request)
+
+        with count_queries() as queries:
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = str(queries.count)
+        response['X-Query-Time-Ms'] = f'{queries.duration * 1000:.1f}'
+        response['X-Duplicate-Queries'] = str(sum(count - 1 for count in queries.duplicates.values()))
+
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        budget = getattr(settings, 'INVENTORY_QUERY_BUDGETS', {}).get(url_name)
+        if budget is not None and queries.count > budget:
+            logger.warning('%s %s ran %s (budget %s)', request.method, request.path, queries.describe(), budget)
+        else:
+            logger.debug('%s %s ran %s', request.method, request.path, queries.describe())
+        return response
+
+
+class ReadYourWritesMiddleware:
+    # Writes, and the requests of the same browser for a replica lag window after one, read from the primary
+    # so a user never misses the sale they just recorded
+    COOKIE_NAME = 'inventory_primary_until'
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_configured():
+            return self.get_response(request)
+
+        writing = request.method not in self.SAFE_METHODS
+        with primary_reads() if writing or self.recently_wrote(request) else nullcontext():
+            response = self.get_response(request)
+
+        if writing:
+            lag = getattr(settings, 'INVENTORY_REPLICA_LAG_SECONDS', 5)
+            response.set_cookie(self.COOKIE_NAME, str(time.time() + lag), max_age=lag, httponly=True,
+                                samesite='Lax')
+        return response
+
+    def recently_wrote(self, request):
+        try:
+            return float(request.COOKIES.get(self.COOKIE_NAME, 0)) > time.time()
+        except ValueError:
+            return False
+
+
+class StaticAssetMiddleware:
+    # Serves collectstatic's output ahead of the session and auth middleware when there is no web server in front.
+    # Fingerprinted names never change content, so they are cached for a year without revalidation, and clients
+    # that accept it get the precompressed sibling BundledManifestStaticFilesStorage wrote next to each file.
+    immutable_cache_control = 'public, max-age=31536000, immutable'
+    encodings = [('br', '.br'), ('gzip', '.gz')]
+
+    def __init__(self, get_response):
+        url = urlsplit(settings.STATIC_URL or '')
+        if not getattr(settings, 'INVENTORY_SERVE_STATIC', False) or not settings.STATIC_ROOT or url.netloc:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = url.path
+        self.root = str(settings.STATIC_ROOT)
+        self.immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        self.max_age = getattr(settings, 'INVENTORY_STATIC_MAX_AGE', 60)
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except ValueError:
+            return self.get_response(request)
+        if not os.path.isfile(path):
+            return self.get_response(request)
+
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            encoding, served = self.negotiate(request, path)
+            response = FileResponse(open(served, 'rb'), content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding'
+        if name in self.immutable:
+            response['Cache-Control'] = self.immutable_cache_control
+        else:
+            response['Cache-Control'] = f'public, max-age={self.max_age}'
+        return response
+
+    def negotiate(self, request, path):
+        accepted = {coding.split(';')[0].strip() for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+        for encoding, suffix in self.encodings:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return encoding, path + suffix
+        return None, path
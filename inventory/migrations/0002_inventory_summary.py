@@ -0,0 +1,72 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:15
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_summary(apps, schema_editor):
+    InventorySummary = apps.get_model('inventory', 'InventorySummary')
+    MonthlyRevenue = apps.get_model('inventory', 'MonthlyRevenue')
+    Sale = apps.get_model('inventory', 'Sale')
+    Stock = apps.get_model('inventory', 'Stock')
+
+    sales = Sale.objects.aggregate(total_sales=Count('id'), total_revenue=Sum('selling_price'))
+    InventorySummary.objects.create(
+        pk=1,
+        total_sales=sales['total_sales'],
+        total_revenue=sales['total_revenue'] or 0,
+        total_stock_quantity=Stock.objects.aggregate(total=Sum('quantity'))['total'] or 0,
+    )
+    monthly = (Sale.objects.annotate(year=ExtractYear('sale_date'), month=ExtractMonth('sale_date'))
+               .values('year', 'month')
+               .annotate(sales_count=Count('id'), revenue=Sum('selling_price'))
+               .order_by())
+    MonthlyRevenue.objects.bulk_create([
+        MonthlyRevenue(year=row['year'], month=row['month'], sales_count=row['sales_count'],
+                       revenue=row['revenue'] or 0)
+        for row in monthly
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_sales', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_stock_quantity', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Inventory Summary',
+                'verbose_name_plural': 'Inventory Summary',
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Monthly Revenue',
+                'verbose_name_plural': 'Monthly Revenue',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrevenue',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_monthly_revenue_period'),
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_inventory_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sale Batch',
+                'verbose_name_plural': 'Sale Batches',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salebatch',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_sale_batch_key'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_sale_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='low_stock_alert_armed',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='low_stock_alerted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollup(apps, schema_editor):
+    Sale = apps.get_model('inventory', 'Sale')
+    SalesDailyRollup = apps.get_model('inventory', 'SalesDailyRollup')
+
+    daily = (Sale.objects.values('sale_date', 'product_id')
+             .annotate(sales_count=Count('id'), quantity=Sum('quantity'), revenue=Sum('selling_price'))
+             .order_by())
+    SalesDailyRollup.objects.bulk_create([
+        SalesDailyRollup(date=row['sale_date'], product_id=row['product_id'], sales_count=row['sales_count'],
+                         quantity=row['quantity'], revenue=row['revenue'] or 0)
+        for row in daily
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_alert_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sales_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Sales Daily Rollup',
+                'verbose_name_plural': 'Sales Daily Rollups',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='unique_sales_daily_rollup'),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='MonthlyRevenue',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_sales_daily_rollup'),
+        ('notifications', '0009_alter_notification_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['product', 'purchase_date'], name='purchase_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_date'], name='sale_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['product', 'sale_date'], name='sale_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('low_stock_threshold'))), fields=['product'], name='stock_low_stock_idx'),
+        ),
+        # The notifications page lists a recipient's notifications newest first. The table belongs to
+        # django-notifications-hq, whose own migrations don't know about this index, so it is created and
+        # dropped here and only here.
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS notification_recipient_ts_idx '
+            'ON notifications_notification (recipient_id, timestamp)',
+            reverse_sql='DROP INDEX IF EXISTS notification_recipient_ts_idx',
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def populate_lots(apps, schema_editor):
+    # Sales never recorded which lots they took, so assume they went first expired first out:
+    # the stock on hand is spread over the latest expiring lots of each product
+    Purchase = apps.get_model('inventory', 'Purchase')
+    Product = apps.get_model('inventory', 'Product')
+    Stock = apps.get_model('inventory', 'Stock')
+
+    stock_levels = Stock.objects.values('product_id').annotate(quantity=Sum('quantity')).order_by()
+    for row in stock_levels:
+        quantity = row['quantity']
+        lots = Purchase.objects.filter(product_id=row['product_id']).order_by(
+            '-expiration_date', '-purchase_date', '-id').values_list('id', 'quantity')
+        for lot_id, lot_quantity in lots.iterator():
+            if quantity <= 0:
+                break
+            remaining_quantity = min(lot_quantity, quantity)
+            Purchase.objects.filter(pk=lot_id).update(remaining_quantity=remaining_quantity)
+            quantity -= remaining_quantity
+
+    earliest_open_lot = Purchase.objects.filter(product_id=OuterRef('pk'), remaining_quantity__gt=0).order_by(
+        'expiration_date').values('expiration_date')[:1]
+    Product.objects.update(next_expiry=Subquery(earliest_open_lot))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='next_expiry',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='expiry_alerted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='remaining_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('remaining_quantity__gt', 0)), fields=['product', 'expiration_date'], name='purchase_open_lot_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('remaining_quantity__gt', 0)), fields=['expiration_date'], name='purchase_open_lot_expiry_idx'),
+        ),
+        migrations.RunPython(populate_lots, migrations.RunPython.noop),
+    ]
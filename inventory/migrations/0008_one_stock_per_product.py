@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_stock(apps, schema_editor):
+    # Keep the oldest stock row of each product, holding the quantity of all of them
+    Stock = apps.get_model('inventory', 'Stock')
+    duplicated = (Stock.objects.values('product_id').annotate(rows=Count('id'), quantity=Sum('quantity'))
+                  .filter(rows__gt=1).order_by())
+    for row in duplicated:
+        stocks = Stock.objects.filter(product_id=row['product_id']).order_by('id')
+        kept = stocks.first()
+        stocks.exclude(pk=kept.pk).delete()
+        kept.quantity = row['quantity']
+        kept.save(update_fields=['quantity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_purchase_lots'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_stock, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stock',
+            name='product',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='inventory.product'),
+        ),
+    ]
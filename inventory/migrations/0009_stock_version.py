@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_one_stock_per_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['updated_at', 'id'], name='stock_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:08
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('inventory', '0010_admin_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryuser',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='user_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), models.F('id'), name='product_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='supplier_name_lower_idx'),
+        ),
+    ]
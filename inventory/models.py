@@ -3,8 +3,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import F, IntegerField, Value
+from django.db import models, connections, router, transaction, IntegrityError
+from django.db.models import Case, F, OuterRef, Subquery, When
+from django.db.models.functions import Lower
 from django.utils import timezone
 from notifications.signals import notify
 
@@ -43,6 +44,12 @@ class InventoryUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
+    class Meta:
+        indexes = [
+            # Typeahead lookups, see inventory.search.prefix_search
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -54,18 +61,29 @@ User = get_user_model()
 
 
 class Supplier(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     contact_person = models.CharField(max_length=255)
     email = models.EmailField()
 
     class Meta:
         verbose_name_plural = "Suppliers"
         verbose_name = "Supplier"
+        indexes = [
+            models.Index(Lower('name'), name='supplier_name_lower_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def refresh_next_expiry(self, product_ids):
+        # One UPDATE for all the products, each picking its earliest open lot through the FEFO index
+        earliest_open_lot = Purchase.objects.filter(product_id=OuterRef('pk'), remaining_quantity__gt=0).order_by(
+            'expiration_date').values('expiration_date')[:1]
+        self.filter(pk__in=product_ids).update(next_expiry=Subquery(earliest_open_lot))
+
+
 class Product(models.Model):
     CATEGORY_CHOICES = [
         ('Electronics', 'Electronics'),
@@ -78,73 +96,255 @@ class Product(models.Model):
         # Add more categories as needed
     ]
 
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     category = models.CharField(max_length=30, choices=CATEGORY_CHOICES)
     responsible_user = models.ForeignKey(User, on_delete=models.CASCADE)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Expiry of the earliest lot still in stock, kept up to date whenever lots are received or consumed
+    next_expiry = models.DateField(null=True, blank=True, db_index=True)
+
+    objects = ProductQuerySet.as_manager()
 
     @property
     def expiration_date(self):
-        # Retrieve the latest purchase and its expiration date for the product
-        latest_purchase = self.purchase_set.order_by('-purchase_date').first()
-        if latest_purchase:
-            return latest_purchase.expiration_date
-        return None
+        return self.next_expiry
 
     def is_expired(self):
-        expiration_date = self.expiration_date
-        return expiration_date is not None and expiration_date < timezone.now().date()
+        return self.next_expiry is not None and self.next_expiry < timezone.now().date()
 
     class Meta:
         verbose_name_plural = "Products"
         verbose_name = "Product"
+        indexes = [
+            # Typeahead and admin searches, in the order the typeahead lists them
+            models.Index(Lower('name'), 'id', name='product_name_lower_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class StockQuerySet(models.QuerySet):
+    def _write_connection(self):
+        return connections[self._db or router.db_for_write(self.model)]
+
+    def _update_returning(self, change, product_id, minimum=None):
+        # Single UPDATE moving the quantity by change and handing back the new stock level. None when no row
+        # matched (or the quantity is below minimum), NotImplemented when the database cannot return columns.
+        connection = self._write_connection()
+        if connection.vendor not in ('postgresql', 'sqlite') or not connection.features.can_return_columns_from_insert:
+            return NotImplemented
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        updated_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        assignments, params = 'quantity = quantity + %s, version = version + 1, updated_at = %s', [change, updated_at]
+        if change > 0:
+            # Re-arms the low stock alert like _move_quantity, the SET expressions see the old quantity
+            assignments += (', low_stock_alert_armed = CASE WHEN quantity + %s > low_stock_threshold THEN %s '
+                            'ELSE low_stock_alert_armed END')
+            params += [change, True]
+        condition = 'product_id = %s'
+        params.append(product_id)
+        if minimum is not None:
+            condition += ' AND quantity >= %s'
+            params.append(minimum)
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {table} SET {assignments} WHERE {condition} '
+                           f'RETURNING quantity, low_stock_threshold', params)
+            return cursor.fetchone()
+
+    def _move_quantity(self, change, **filters):
+        # ORM fallback of _update_returning. Every path that adds stock re-arms the low stock alert once the
+        # quantity is back above the threshold, so the next low stock episode alerts again.
+        changes = {'quantity': F('quantity') + change, 'version': F('version') + 1, 'updated_at': timezone.now()}
+        if change > 0:
+            changes['low_stock_alert_armed'] = Case(When(quantity__gt=F('low_stock_threshold') - change, then=True),
+                                                    default=F('low_stock_alert_armed'))
+        return self.filter(**filters).update(**changes)
+
+    def _stock_level(self, product_id):
+        return self.filter(product_id=product_id).values_list('quantity', 'low_stock_threshold').first()
+
+    def decrement(self, product_id, quantity):
+        # Conditional single statement decrement that can never oversell.
+        # Returns (new quantity, low stock threshold), or None when there is not enough stock.
+        stock_level = self._update_returning(-quantity, product_id, minimum=quantity)
+        if stock_level is not NotImplemented:
+            return stock_level
+
+        if not self._move_quantity(-quantity, product_id=product_id, quantity__gte=quantity):
+            return None
+        return self._stock_level(product_id)
+
+    def increment(self, product_id, quantity):
+        # Returns (new quantity, low stock threshold) like decrement, creating the stock row if needed
+        stock_level = self._update_returning(quantity, product_id)
+        if stock_level is NotImplemented:
+            updated = self._move_quantity(quantity, product_id=product_id)
+            stock_level = self._stock_level(product_id) if updated else None
+        if stock_level is not None:
+            return stock_level
+
+        try:
+            with transaction.atomic(using=self._db):
+                # Created empty, the units are then counted once by the increment like for any existing row
+                self.create(product_id=product_id)
+        except IntegrityError:
+            # Another writer created the product's stock row first
+            pass
+        return self.increment(product_id, quantity)
+
+    def low_stock(self):
+        # Same condition as the partial stock_low_stock_idx index
+        return self.filter(quantity__lte=F('low_stock_threshold'))
+
+
 class Stock(models.Model):
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='stock')
     quantity = models.PositiveIntegerField(default=0)
     low_stock_threshold = models.PositiveIntegerField(default=10)
+    # Low stock alert state, an alert disarms it and any stock increase back above the threshold re-arms it
+    low_stock_alert_armed = models.BooleanField(default=True)
+    low_stock_alerted_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by every change to the stock level, the stock API derives its ETags from them
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = StockQuerySet.as_manager()
 
     def is_low_stock(self):
-        # Annotate the current quantity and threshold values
-        annotated_stock = Stock.objects.annotate(
-            current_quantity=F('quantity'),
-            current_threshold=Value(self.low_stock_threshold, output_field=IntegerField())
-        ).values('current_quantity', 'current_threshold').get(pk=self.pk)
+        return self.quantity <= self.low_stock_threshold
 
-        # Compare the annotated values
-        return annotated_stock['current_quantity'] <= annotated_stock['current_threshold']
+    def save(self, *args, **kwargs):
+        # Saves are admin edits and new rows, the summary signal handler moves the stock total by quantity_change
+        if self._state.adding:
+            self.quantity_change = self.quantity
+        else:
+            previous_quantity = Stock.objects.filter(pk=self.pk).values_list('quantity', flat=True).first()
+            self.quantity_change = self.quantity - (previous_quantity or 0)
+            self.version += 1
+            self.updated_at = timezone.now()
+            if self.quantity_change > 0 and not self.is_low_stock():
+                self.low_stock_alert_armed = True
+        super().save(*args, **kwargs)
 
     class Meta:
         verbose_name_plural = "Stocks"
         verbose_name = "Stock"
+        indexes = [
+            # Partial index holding only the low stock rows, matches quantity <= low_stock_threshold filters
+            models.Index(fields=['product'], name='stock_low_stock_idx',
+                         condition=models.Q(quantity__lte=models.F('low_stock_threshold'))),
+            models.Index(fields=['updated_at', 'id'], name='stock_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - Quantity: {self.quantity}"
 
 
+class PurchaseQuerySet(models.QuerySet):
+    def open_lots(self, product_id):
+        # First expired, first out
+        return self.filter(product_id=product_id, remaining_quantity__gt=0).order_by(
+            'expiration_date', 'purchase_date', 'id')
+
+    def consume(self, product_id, quantity):
+        # Take units from the open lots of a product, earliest expiry first. Called after the stock decrement
+        # in the same transaction, so the stock row lock already serializes sales of the product.
+        # Stock stays the source of truth for availability, lots only track which units are left.
+        # Returns whether a lot ran out, the only case where the product's next expiry moves.
+        emptied = False
+        for lot_id, remaining_quantity in self.open_lots(product_id).values_list('id', 'remaining_quantity'):
+            if quantity <= 0:
+                break
+            taken = min(remaining_quantity, quantity)
+            self.filter(pk=lot_id).update(remaining_quantity=F('remaining_quantity') - taken)
+            emptied = emptied or taken == remaining_quantity
+            quantity -= taken
+        return emptied
+
+    def restore(self, product_id, quantity):
+        # Put units back into the latest expiring lots, the reverse of consume.
+        # Returns whether an empty lot was reopened.
+        reopened = False
+        lots = self.filter(product_id=product_id, remaining_quantity__lt=F('quantity')).order_by(
+            '-expiration_date', '-purchase_date', '-id')
+        for lot_id, lot_quantity, remaining_quantity in lots.values_list('id', 'quantity', 'remaining_quantity'):
+            if quantity <= 0:
+                break
+            returned = min(lot_quantity - remaining_quantity, quantity)
+            self.filter(pk=lot_id).update(remaining_quantity=F('remaining_quantity') + returned)
+            reopened = reopened or remaining_quantity == 0
+            quantity -= returned
+        return reopened
+
+
 class Purchase(models.Model):
+    # Every purchase is a lot, remaining_quantity is what is left of it after sales
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     acquisition_price = models.DecimalField(max_digits=10, decimal_places=2)
     purchase_date = models.DateField(default=timezone.now)
     expiration_date = models.DateField()  # New field for the expiration date
+    remaining_quantity = models.PositiveIntegerField(default=0)
+    expiry_alerted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PurchaseQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Purchases"
         verbose_name = "Purchase"
+        indexes = [
+            models.Index(fields=['product', 'purchase_date'], name='purchase_product_date_idx'),
+            models.Index(fields=['purchase_date'], name='purchase_date_idx'),
+            # Open lots only, for FEFO consumption per product and the expiry sweeper's date range scan
+            models.Index(fields=['product', 'expiration_date'], name='purchase_open_lot_fefo_idx',
+                         condition=models.Q(remaining_quantity__gt=0)),
+            models.Index(fields=['expiration_date'], name='purchase_open_lot_expiry_idx',
+                         condition=models.Q(remaining_quantity__gt=0)),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - Quantity: {self.quantity}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+    def _previous_lot(self, for_update=False):
+        # The lot as stored before this save, None while it is being created
+        if self._state.adding:
+            return None
+        lots = Purchase.objects.select_for_update() if for_update else Purchase.objects.all()
+        return lots.filter(pk=self.pk).values('product_id', 'quantity', 'remaining_quantity').first()
+
+    def _sold_units(self, previous):
+        # Units already sold from the lot stay sold, an edit can't take the lot below them or move them
+        sold = previous['quantity'] - previous['remaining_quantity']
+        if self.quantity is not None and self.quantity < sold:
+            raise ValidationError(f'{sold} units of this purchase have already been sold, '
+                                  f'the quantity cannot go below that')
+        if sold and previous['product_id'] != self.product_id:
+            raise ValidationError('Units of this purchase have already been sold, it cannot move to another product')
+        return sold
 
-        # The update_stock signal will take care of updating the stock and sending notifications
+    def clean(self):
+        previous = self._previous_lot()
+        if previous is not None:
+            self._sold_units(previous)
+        super().clean()
+
+    def save(self, *args, **kwargs):
+        # The handle_purchase signal applies stock_changes, units per product, to the stock rows and the summary.
+        # Editing a purchase only moves the difference to its previous quantity.
+        with transaction.atomic():
+            previous = self._previous_lot(for_update=True)
+            if previous is None:
+                self.remaining_quantity = self.quantity
+                self.stock_changes = {self.product_id: self.quantity}
+            else:
+                self.remaining_quantity = self.quantity - self._sold_units(previous)
+                if previous['product_id'] != self.product_id:
+                    self.stock_changes = {previous['product_id']: -previous['quantity'], self.product_id: self.quantity}
+                else:
+                    self.stock_changes = {self.product_id: self.quantity - previous['quantity']}
+            super().save(*args, **kwargs)
 
 
 class Sale(models.Model):
@@ -156,35 +356,133 @@ class Sale(models.Model):
     class Meta:
         verbose_name_plural = "Sales"
         verbose_name = "Sale"
+        indexes = [
+            models.Index(fields=['sale_date'], name='sale_date_idx'),
+            models.Index(fields=['product', 'sale_date'], name='sale_product_date_idx'),
+        ]
 
     def clean(self):
+        if self.product_id is None:
+            # The form already reports the missing or unavailable product
+            return
         if not self.is_valid_sale():
             raise ValidationError(f"Not enough stock available for {self.product.name} - Quantity: {self.quantity}")
         else:
             self.selling_price = self.product.selling_price * self.quantity
         super().clean()
 
+    def _previous_sale(self):
+        # The sale as stored before this save, None while it is being created
+        if self._state.adding:
+            return None
+        return Sale.objects.filter(pk=self.pk).first()
+
+    def _quantity_change(self, previous_sale):
+        # How much stock of self.product this save takes, editing a sale only moves the difference
+        # unless it moved to another product
+        if previous_sale is None or previous_sale.product_id != self.product_id:
+            return self.quantity
+        return self.quantity - previous_sale.quantity
+
     def is_valid_sale(self):
-        return self.product.stock_set.exists() and self.product.stock_set.first().quantity >= self.quantity
+        quantity_change = self._quantity_change(self._previous_sale())
+        return Stock.objects.filter(product_id=self.product_id, quantity__gte=quantity_change).exists()
 
     def __str__(self):
         return f"{self.product.name} - Quantity: {self.quantity}"
 
     def save(self, *args, **kwargs):
-        # Check if there is enough stock available for the sale
-        stock, created = Stock.objects.get_or_create(product=self.product)
-        if stock.quantity >= self.quantity:
-            self.full_clean()
+        with transaction.atomic():
+            # The signal handlers read these to update the summary and publish the stock levels
+            self.previous_sale = previous_sale = self._previous_sale()
+            self.stock_level = self.restored_stock_level = None
+            if self.selling_price is None or (previous_sale is not None and (
+                    previous_sale.product_id, previous_sale.quantity) != (self.product_id, self.quantity)):
+                self.selling_price = self.product.selling_price * self.quantity
+
+            if previous_sale is not None and previous_sale.product_id != self.product_id:
+                # Moved to another product, which gives its units back to the old one
+                self.restored_stock_level = Stock.objects.increment(previous_sale.product_id, previous_sale.quantity)
+                if Purchase.objects.restore(previous_sale.product_id, previous_sale.quantity):
+                    Product.objects.refresh_next_expiry([previous_sale.product_id])
+
+            # Take the stock and insert the sale in the same transaction, the remaining quantity comes back
+            # with the update so the low stock check needs no extra query
+            quantity_change = self._quantity_change(previous_sale)
+            self.low_stock = False
+            if quantity_change > 0:
+                stock_level = Stock.objects.decrement(self.product_id, quantity_change)
+                if stock_level is None:
+                    raise ValidationError(
+                        f"Not enough stock available for {self.product.name} - Quantity: {self.quantity}")
+                self.stock_level = stock_level
+                self.remaining_stock, low_stock_threshold = stock_level
+                self.low_stock = self.remaining_stock <= low_stock_threshold
+                if Purchase.objects.consume(self.product_id, quantity_change):
+                    Product.objects.refresh_next_expiry([self.product_id])
+            elif quantity_change < 0:
+                self.stock_level = Stock.objects.increment(self.product_id, -quantity_change)
+                self.remaining_stock = self.stock_level[0]
+                if Purchase.objects.restore(self.product_id, -quantity_change):
+                    Product.objects.refresh_next_expiry([self.product_id])
+
             super().save(*args, **kwargs)
 
-            # Update stock level after a sale
-            stock.quantity -= self.quantity
-            stock.save()
 
-            # Check and notify if stock is low after the sale
-            if stock.is_low_stock():
-                notify.send(stock, recipient=self.product.responsible_user, verb='Low Stock Notification',
-                            description=f'The stock of {self.product.name} is low. Please order more.')
+class SaleBatch(models.Model):
+    # One uploaded batch of register sales, the idempotency key makes retried uploads no-ops
+    idempotency_key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    sales_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
 
-        else:
-            raise ValidationError(f"Not enough stock available for {self.product.name} - Quantity: {self.quantity}")
+    class Meta:
+        verbose_name_plural = "Sale Batches"
+        verbose_name = "Sale Batch"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_sale_batch_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.idempotency_key} - Sales: {self.sales_count}"
+
+
+class InventorySummary(models.Model):
+    # Single-row table holding the dashboard totals, kept up to date by the signal handlers
+    total_sales = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_stock_quantity = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Inventory Summary"
+        verbose_name = "Inventory Summary"
+
+    @classmethod
+    def load(cls):
+        summary, _ = cls.objects.get_or_create(pk=1)
+        return summary
+
+    def __str__(self):
+        return f"Sales: {self.total_sales} - Revenue: {self.total_revenue}"
+
+
+class SalesDailyRollup(models.Model):
+    # Sales per product per day, maintained from the sale write paths and rebuilt by rebuild_sales_rollup
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    sales_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Sales Daily Rollups"
+        verbose_name = "Sales Daily Rollup"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_sales_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id} - Revenue: {self.revenue}"
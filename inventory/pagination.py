@@ -0,0 +1,175 @@
+# inventory/pagination.py
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def _field_for(model, path):
+    field = None
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+def _split(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor, queryset, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        fields = [_field_for(queryset.model, name) for name, _ in _split(ordering)]
+        if len(values) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _seek(ordering, values, forward):
+    # (a, b) after (x, y) becomes a > x OR (a = x AND b > y), flipped per descending field
+    condition = Q()
+    equal = {}
+    for (name, descending), value in zip(_split(ordering), values):
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def _page_size(request):
+    default = getattr(settings, 'INVENTORY_PAGE_SIZE', 25)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, getattr(settings, 'INVENTORY_MAX_PAGE_SIZE', 100)))
+
+
+class KeysetPage:
+    def __init__(self, request, items, ordering, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._request = request
+        self._ordering = ordering
+
+    def _cursor(self, item):
+        values = []
+        for name, _ in _split(self._ordering):
+            value = item
+            for attribute in name.split('__'):
+                value = getattr(value, attribute)
+            values.append(value)
+        return encode_cursor(values)
+
+    def _link(self, **cursor):
+        query = self._request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query.update(cursor)
+        return f'?{query.urlencode()}'
+
+    @property
+    def next_link(self):
+        if self.has_next and self.items:
+            return self._link(after=self._cursor(self.items[-1]))
+
+    @property
+    def previous_link(self):
+        if self.has_previous and self.items:
+            return self._link(before=self._cursor(self.items[0]))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(request, queryset, ordering):
+    # Seek by the last row seen instead of OFFSET, so every page costs the same however deep it is.
+    # The ordering must end with a unique field (normally the primary key) for the seek to be stable.
+    page_size = _page_size(request)
+    after = decode_cursor(request.GET['after'], queryset, ordering) if request.GET.get('after') else None
+    before = decode_cursor(request.GET['before'], queryset, ordering) if request.GET.get('before') else None
+
+    if before is not None:
+        reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+        rows = list(queryset.filter(_seek(ordering, before, forward=False))
+                    .order_by(*reversed_ordering)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        return KeysetPage(request, rows[:page_size][::-1], ordering, has_next=True, has_previous=has_previous)
+
+    if after is not None:
+        queryset = queryset.filter(_seek(ordering, after, forward=True))
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    return KeysetPage(request, rows[:page_size], ordering, has_next=len(rows) > page_size,
+                      has_previous=after is not None)
+
+
+def estimated_count(queryset):
+    # Row count from the planner statistics (PostgreSQL) or the highest primary key (SQLite), None when the
+    # queryset is filtered or the backend has nothing cheap to offer
+    if queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    meta = queryset.model._meta
+    if connection.vendor == 'postgresql':
+        sql, params = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [meta.db_table]
+    elif connection.vendor == 'sqlite':
+        table, column = connection.ops.quote_name(meta.db_table), connection.ops.quote_name(meta.pk.column)
+        sql, params = f'SELECT MAX({column}) FROM {table}', []
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    # For the admin changelists of tables too large to COUNT(*) on every page view. Unfiltered listings use
+    # the estimate once it is past the threshold, filtered ones (and small tables) still count exactly.
+    def __init__(self, *args, estimate_threshold=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimate_threshold = estimate_threshold if estimate_threshold is not None else getattr(
+            settings, 'INVENTORY_ESTIMATED_COUNT_THRESHOLD', 100000)
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            self.estimated = True
+            return estimate
+        return super().count
+
+    def page(self, number):
+        # The estimate can run past the real end (deleted rows still count in SQLite's MAX(pk)) or stop short
+        # of it (stale planner statistics). A page it got wrong is served from the exact count instead,
+        # clamped to the last page that has rows.
+        if not self.estimated:
+            return super().page(number)
+        try:
+            page = super().page(number)
+            if page.number == 1 or page.object_list:
+                return page
+        except EmptyPage:
+            pass
+        self.estimated = False
+        self.__dict__['count'] = super().count
+        self.__dict__.pop('num_pages', None)
+        return self.get_page(number)
@@ -0,0 +1,42 @@
+# inventory/querycount.py
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+class QueryCounter:
+    # Database execute wrapper recording how many queries ran, how long they took and which SQL repeated
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            # The SQL still has its parameter placeholders, so repeats of the same query shape share a key
+            self.shapes[sql] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.shapes.most_common() if count > 1}
+
+    def describe(self):
+        lines = [f'{self.count} queries in {self.duration * 1000:.1f}ms']
+        lines += [f'  {count}x {sql}' for sql, count in self.duplicates.items()]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        yield counter
@@ -0,0 +1,57 @@
+# inventory/routers.py
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_reporting = contextvars.ContextVar('inventory_reporting_reads', default=False)
+_pinned = contextvars.ContextVar('inventory_pinned_to_primary', default=False)
+
+
+def read_database():
+    # Where reporting reads go right now: the read alias, unless this request has to see its own writes
+    if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return getattr(settings, 'INVENTORY_READ_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def replica_configured():
+    return getattr(settings, 'INVENTORY_READ_DATABASE', DEFAULT_DB_ALIAS) != DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reporting_reads():
+    # Usable as a decorator too, reads inside are routed to read_database()
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReportingRouter:
+    # Only reads made inside reporting_reads() leave the primary, everything else keeps Django's defaults.
+    # The replica is populated by replication (or sync_replica locally), never migrated directly.
+    def db_for_read(self, model, **hints):
+        if _reporting.get():
+            return read_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
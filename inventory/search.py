@@ -0,0 +1,14 @@
+# inventory/search.py
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+# Sorts after any character a name can continue with
+MAX_CHARACTER = '\U0010ffff'
+
+
+def prefix_search(field, term):
+    # Case-insensitive prefix match written as a range on LOWER(field), which the Lower() indexes are searched for.
+    # istartswith compiles to LIKE on SQLite and UPPER() LIKE on PostgreSQL, neither of which can seek an index.
+    prefix = term.lower()
+    return Q(GreaterThanOrEqual(Lower(field), prefix), LessThan(Lower(field), prefix + MAX_CHARACTER))
@@ -1,58 +1,149 @@
 # inventory/signals.py
-from django.core.mail import send_mail
+from django.contrib.admin.models import LogEntry
+from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import F
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.template.loader import render_to_string
 from django.utils import timezone
-from django.utils.html import strip_tags
-from notifications.signals import notify
+from notifications.models import Notification
 
-from inventory.models import Purchase, Stock, Sale
+from inventory import summary
+from inventory.alerts import queue_low_stock_alerts
+from inventory.cache import bump_data_version, bump_user_version
+from inventory.events import publish_notification, publish_stock_level
+from inventory.inbox import adjust_unread_count
+from inventory.models import InventoryUser, Product, Purchase, Stock, Sale
 
 
 @receiver(post_save, sender=Purchase)
 def handle_purchase(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+
     with transaction.atomic():
-        # Check if the product already exists in stock
-        stock, created = Stock.objects.get_or_create(product=instance.product)
+        low_stock = []
+        for product_id, quantity in instance.stock_changes.items():
+            if quantity > 0:
+                # Add to the existing stock row, or create it with the purchased quantity
+                stock_level = Stock.objects.increment(product_id, quantity)
+            elif quantity < 0:
+                # The lot's unsold units are part of the stock, so this can only fail on a stock row edited by hand
+                stock_level = Stock.objects.decrement(product_id, -quantity)
+                if stock_level is None:
+                    raise ValidationError('The stock no longer holds the units removed from this purchase')
+                if stock_level[0] <= stock_level[1]:
+                    low_stock.append(product_id)
+            else:
+                continue
+            publish_stock_level(product_id, *stock_level)
+
+        product_ids = list(instance.stock_changes)
+        if low_stock:
+            queue_low_stock_alerts(low_stock)
+        Product.objects.refresh_next_expiry(product_ids)
 
-        # If the product already exists in stock, update the quantity
-        if not created:
-            stock.quantity = F('quantity') + instance.quantity
-        else:
-            # If the product does not exist in stock, set the initial quantity
-            stock.quantity = instance.quantity
+        summary.record_stock_change(sum(instance.stock_changes.values()))
 
-        stock.save()
+
+@receiver(post_delete, sender=Purchase)
+def handle_purchase_delete(sender, instance, **kwargs):
+    Product.objects.refresh_next_expiry([instance.product_id])
 
 
 @receiver(post_save, sender=Sale)
 def handle_sale(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+
+    # Sale.save has already taken the stock and knows whether it is now low
     with transaction.atomic():
-        stock, _ = Stock.objects.get_or_create(product=instance.product)
-        stock.quantity = F('quantity') - instance.quantity
-        stock.save()
+        if created:
+            summary.record_sale(instance)
+        elif getattr(instance, 'previous_sale', None) is not None:
+            summary.revise_sale(instance.previous_sale, instance)
+
+        if getattr(instance, 'low_stock', False):
+            queue_low_stock_alerts([instance.product_id])
+
+        if getattr(instance, 'stock_level', None):
+            publish_stock_level(instance.product_id, *instance.stock_level)
+
+        if getattr(instance, 'restored_stock_level', None):
+            # The sale moved to another product, the old one got its units back
+            publish_stock_level(instance.previous_sale.product_id, *instance.restored_stock_level)
+
+
+@receiver(post_save, sender=Stock)
+def publish_stock_edit(sender, instance, **kwargs):
+    # Edits made through the admin, the StockQuerySet updates publish from their callers
+    if not kwargs.get('raw'):
+        publish_stock_level(instance.product_id, instance.quantity, instance.low_stock_threshold)
+
+
+@receiver(post_save, sender=Stock)
+def count_stock_edit(sender, instance, **kwargs):
+    # New rows and admin edits, the StockQuerySet updates are counted by the purchase and sale handlers
+    if not kwargs.get('raw'):
+        summary.record_stock_change(instance.quantity_change)
+
+
+@receiver(post_delete, sender=Stock)
+def uncount_deleted_stock(sender, instance, **kwargs):
+    summary.record_stock_change(-instance.quantity)
+
+
+@receiver(post_save, sender=Product)
+def touch_product_stock(sender, instance, created, **kwargs):
+    # The stock API serves the product name with the stock row, an edited product has to change the row's
+    # version (its ETag) and updated_at (the changes feed) like a stock change would
+    if not created and not kwargs.get('raw'):
+        Stock.objects.filter(product_id=instance.pk).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Sale)
+def handle_sale_delete(sender, instance, **kwargs):
+    summary.remove_sale(instance)
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def invalidate_inventory_cache(sender, instance, **kwargs):
+    bump_data_version()
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_cache(sender, instance, **kwargs):
+    bump_user_version(instance.recipient_id)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created:
+        publish_notification(instance)
+        if instance.unread:
+            adjust_unread_count(instance.recipient_id, 1)
+
 
-        if stock.is_low_stock():
-            notify.send(stock, recipient=instance.product.responsible_user, verb='Low Stock Notification',
-                        description=f'The stock of {instance.product.name} is low. Please order more.', level='warning')
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if instance.unread:
+        adjust_unread_count(instance.recipient_id, -1)
 
-            # Send email notification to responsible user
-            send_email_notification(instance.product.responsible_user.email, 'Low Stock Notification',
-                                    f'The stock of {instance.product.name} is low. Please order more.')
 
-            # Send email notification to supplier
-            latest_purchase = instance.product.purchase_set.order_by('-purchase_date').first()
-            if latest_purchase:
-                send_email_notification(latest_purchase.supplier.email, 'Low Stock Notification',
-                                        f'The stock of {instance.product.name} is low. Please supply more.')
+@receiver(post_save, sender=LogEntry)
+@receiver(post_delete, sender=LogEntry)
+def invalidate_recent_actions_cache(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
 
 
-def send_email_notification(recipient_email, subject, message):
-    html_message = render_to_string('inventory/email_notification_template.html',
-                                    {'subject': subject, 'message': message})
-    plain_message = strip_tags(html_message)
+@receiver(post_save, sender=InventoryUser)
+def invalidate_user_fragments(sender, instance, **kwargs):
+    # The cached sidebar and nav show the user's name and role
+    bump_user_version(instance.pk)
 
-    send_mail(subject, plain_message, 'devwanjala148@gmail.com', [recipient_email], html_message=html_message)
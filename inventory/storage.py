@@ -0,0 +1,74 @@
+# inventory/storage.py
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip siblings are always written
+    brotli = None
+
+IMPORT_RE = re.compile(r'@import[^;]+;')
+SOURCE_MAP_RE = re.compile(r'/\*# sourceMappingURL=[^*]*\*/')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.map', '.json', '.txt', '.html', '.xml', '.ttf', '.eot', '.otf')
+
+
+class BundledManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # collectstatic concatenates the INVENTORY_STATIC_BUNDLES stylesheets, fingerprints everything through the
+    # manifest and writes .gz (and .br when brotli is installed) siblings for the middleware to serve
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for bundle, sources in getattr(settings, 'INVENTORY_STATIC_BUNDLES', {}).items():
+            self._save_file(bundle, self._bundle(paths, sources))
+            paths[bundle] = (self, bundle)
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+        for name in set(self.hashed_files) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self._compress(name)
+
+    def _bundle(self, paths, sources):
+        # Sources are expected to live next to the bundle so their relative url()s keep working.
+        # @import rules only count at the top of a stylesheet, and the source maps no longer line up.
+        imports, bodies = [], []
+        for source in sources:
+            storage, path = paths[source]
+            with storage.open(path) as file:
+                content = SOURCE_MAP_RE.sub('', file.read().decode())
+            imports.extend(IMPORT_RE.findall(content))
+            bodies.append(f'/* {source} */\n{IMPORT_RE.sub("", content).strip()}\n')
+        return '\n'.join(imports + bodies)
+
+    def _compress(self, name):
+        with self.open(name) as file:
+            content = file.read()
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content)
+        for suffix, compressed in variants.items():
+            # Not worth a second file (and a branch in the middleware) for a few saved bytes
+            if len(compressed) < len(content) * 0.95:
+                self._save_file(name + suffix, compressed)
+
+    def _save_file(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content.encode() if isinstance(content, str) else content))
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except (ValueError, SuspiciousFileOperation):
+                # The theme references fonts, images and source maps it never shipped, leave those urls as they were
+                return matchobj.group(0)
+
+        return convert
@@ -0,0 +1,196 @@
+# inventory/summary.py
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
+from django.utils import timezone
+
+from inventory.models import InventorySummary, SalesDailyRollup, Sale, Stock
+
+
+def _update_summary(**changes):
+    # Apply F() deltas to the summary row, creating it from scratch the first time
+    updates = {field: F(field) + delta for field, delta in changes.items()}
+    if not InventorySummary.objects.filter(pk=1).update(**updates):
+        rebuild_summary()
+
+
+def _as_date(value):
+    # A sale created with the timezone.now default still holds a datetime until it is reloaded
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _update_daily_rollup(date, product_id, sales_count, quantity, revenue):
+    updated = SalesDailyRollup.objects.filter(date=date, product_id=product_id).update(
+        sales_count=F('sales_count') + sales_count,
+        quantity=F('quantity') + quantity,
+        revenue=F('revenue') + revenue,
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                SalesDailyRollup.objects.create(date=date, product_id=product_id, sales_count=sales_count,
+                                                quantity=quantity, revenue=revenue)
+        except IntegrityError:
+            # Another writer created the row first, fall back to the increment
+            _update_daily_rollup(date, product_id, sales_count, quantity, revenue)
+
+
+def record_purchases(purchases):
+    _update_summary(total_stock_quantity=sum(purchase.quantity for purchase in purchases))
+
+
+def record_stock_change(quantity):
+    # Purchase edits, admin stock edits and deleted stock rows
+    if quantity:
+        _update_summary(total_stock_quantity=quantity)
+
+
+def record_sale(sale):
+    record_sales([sale])
+
+
+def record_sales(sales):
+    # Fold many sales into one summary update and one rollup update per day and product touched
+    total_revenue = Decimal('0')
+    total_quantity = 0
+    daily = defaultdict(lambda: [0, 0, Decimal('0')])
+    for sale in sales:
+        revenue = sale.selling_price or Decimal('0')
+        total_revenue += revenue
+        total_quantity += sale.quantity
+        rollup = daily[_as_date(sale.sale_date), sale.product_id]
+        rollup[0] += 1
+        rollup[1] += sale.quantity
+        rollup[2] += revenue
+
+    _update_summary(total_sales=len(sales), total_revenue=total_revenue, total_stock_quantity=-total_quantity)
+    for (date, product_id), (sales_count, quantity, revenue) in daily.items():
+        _update_daily_rollup(date, product_id, sales_count, quantity, revenue)
+
+
+def _remove_from_rollup(sale, revenue):
+    # Never creates a row: a missing one means the product is being deleted and its rollups went first
+    SalesDailyRollup.objects.filter(date=_as_date(sale.sale_date), product_id=sale.product_id).update(
+        sales_count=F('sales_count') - 1,
+        quantity=F('quantity') - sale.quantity,
+        revenue=F('revenue') - revenue,
+    )
+
+
+def remove_sale(sale):
+    revenue = sale.selling_price or Decimal('0')
+    _update_summary(total_sales=-1, total_revenue=-revenue)
+    _remove_from_rollup(sale, revenue)
+
+
+def revise_sale(previous_sale, sale):
+    # An edited sale moves the totals by what changed and its rollup from the old day and product to the new ones
+    previous_revenue = previous_sale.selling_price or Decimal('0')
+    revenue = sale.selling_price or Decimal('0')
+    _update_summary(total_revenue=revenue - previous_revenue,
+                    total_stock_quantity=previous_sale.quantity - sale.quantity)
+    _remove_from_rollup(previous_sale, previous_revenue)
+    _update_daily_rollup(_as_date(sale.sale_date), sale.product_id, 1, sale.quantity, revenue)
+
+
+@transaction.atomic
+def rebuild_summary():
+    sales = Sale.objects.aggregate(total_sales=Count('id'), total_revenue=Sum('selling_price'))
+    total_stock_quantity = Stock.objects.aggregate(total_quantity=Sum('quantity'))['total_quantity'] or 0
+
+    summary, _ = InventorySummary.objects.select_for_update().get_or_create(pk=1)
+    summary.total_sales = sales['total_sales']
+    summary.total_revenue = sales['total_revenue'] or 0
+    summary.total_stock_quantity = total_stock_quantity
+    summary.save()
+
+    return summary
+
+
+@transaction.atomic
+def rebuild_sales_rollup(start_date=None, end_date=None):
+    # Recompute the daily rollup rows for a date range (everything by default) straight from the sales
+    rollups = SalesDailyRollup.objects.all()
+    sales = Sale.objects.all()
+    if start_date:
+        rollups = rollups.filter(date__gte=start_date)
+        sales = sales.filter(sale_date__gte=start_date)
+    if end_date:
+        rollups = rollups.filter(date__lte=end_date)
+        sales = sales.filter(sale_date__lte=end_date)
+
+    rollups.delete()
+    daily = (sales.values('sale_date', 'product_id')
+             .annotate(sales_count=Count('id'), quantity=Sum('quantity'), revenue=Sum('selling_price'))
+             .order_by())
+    created = SalesDailyRollup.objects.bulk_create(
+        (SalesDailyRollup(date=row['sale_date'], product_id=row['product_id'], sales_count=row['sales_count'],
+                          quantity=row['quantity'], revenue=row['revenue'] or 0)
+         for row in daily.iterator(chunk_size=2000)),
+        batch_size=1000,
+    )
+    return len(created)
+
+
+def _month_start(date, months_back=0):
+    month_index = date.year * 12 + date.month - 1 - months_back
+    return date.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def revenue_trend(today):
+    # Current month to date against the whole previous month, read from at most two months of rollup rows
+    current_start = _month_start(today)
+    previous_start = _month_start(today, months_back=1)
+    revenue = SalesDailyRollup.objects.filter(date__gte=previous_start, date__lte=today).aggregate(
+        current=Sum('revenue', filter=Q(date__gte=current_start)),
+        previous=Sum('revenue', filter=Q(date__lt=current_start)),
+    )
+    current_month_revenue = round(revenue['current'] or 0, 2)
+    previous_month_revenue = round(revenue['previous'] or 0, 2)
+
+    trend = None
+    percentage_change = 0
+
+    if current_month_revenue > previous_month_revenue:
+        trend = "Up"
+        if previous_month_revenue != 0:
+            percentage_change = ((current_month_revenue - previous_month_revenue) / previous_month_revenue) * 100
+        else:
+            percentage_change = 100
+    elif current_month_revenue < previous_month_revenue:
+        trend = "Down"
+        if previous_month_revenue != 0:
+            percentage_change = ((previous_month_revenue - current_month_revenue) / previous_month_revenue) * 100
+        else:
+            percentage_change = 100
+
+    return trend, round(percentage_change, 2)
+
+
+SERIES_BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+def sales_series(bucket, start_date=None, end_date=None, product_id=None):
+    rollups = SalesDailyRollup.objects.all()
+    if start_date:
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date:
+        rollups = rollups.filter(date__lte=end_date)
+    if product_id:
+        rollups = rollups.filter(product_id=product_id)
+
+    return list(rollups.annotate(period=SERIES_BUCKETS[bucket]('date'))
+                .values('period')
+                .annotate(sales_count=Sum('sales_count'), quantity=Sum('quantity'), revenue=Sum('revenue'))
+                .order_by('period'))
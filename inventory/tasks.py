@@ -0,0 +1,87 @@
+# inventory/tasks.py
+from datetime import timedelta
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from notifications.signals import notify
+
+from inventory.inbox import prune_read_notifications
+from inventory.models import Purchase, Stock
+
+FROM_EMAIL = 'devwanjala148@gmail.com'
+
+
+def build_email_message(recipient_email, subject, message, connection=None):
+    html_message = render_to_string('inventory/email_notification_template.html',
+                                    {'subject': subject, 'message': message})
+    email = EmailMultiAlternatives(subject, strip_tags(html_message), FROM_EMAIL, [recipient_email],
+                                   connection=connection)
+    email.attach_alternative(html_message, 'text/html')
+    return email
+
+
+@shared_task
+def send_low_stock_alerts(product_ids):
+    emails = []
+    stocks = Stock.objects.filter(product_id__in=product_ids).select_related('product__responsible_user')
+    for stock in stocks:
+        product = stock.product
+        notify.send(stock, recipient=product.responsible_user, verb='Low Stock Notification',
+                    description=f'The stock of {product.name} is low. Please order more.', level='warning')
+
+        # Email the responsible user and the supplier of the latest purchase
+        emails.append((product.responsible_user.email, 'Low Stock Notification',
+                       f'The stock of {product.name} is low. Please order more.'))
+        latest_purchase = product.purchase_set.select_related('supplier').order_by('-purchase_date').first()
+        if latest_purchase:
+            emails.append((latest_purchase.supplier.email, 'Low Stock Notification',
+                           f'The stock of {product.name} is low. Please supply more.'))
+
+    # Emails retry on their own, so a flaky SMTP server never duplicates the notifications above
+    if emails:
+        send_notification_emails.delay(emails)
+
+
+@shared_task(autoretry_for=(SMTPException, OSError), retry_backoff=True, max_retries=5)
+def send_notification_emails(emails):
+    # One SMTP connection for the whole batch instead of one per message
+    with get_connection() as connection:
+        messages = [build_email_message(recipient_email, subject, message, connection=connection)
+                    for recipient_email, subject, message in emails]
+        connection.send_messages(messages)
+
+
+@shared_task
+def sweep_expiring_lots():
+    # Range scan over the open lot expiry index, each lot is reported once when it enters the warning window
+    today = timezone.now().date()
+    horizon = today + timedelta(days=getattr(settings, 'INVENTORY_EXPIRY_WARNING_DAYS', 7))
+    lots = list(Purchase.objects.filter(remaining_quantity__gt=0, expiration_date__lte=horizon,
+                                        expiry_alerted_at__isnull=True)
+                .select_related('product__responsible_user').order_by('expiration_date'))
+    if not lots:
+        return 0
+    Purchase.objects.filter(pk__in=[lot.pk for lot in lots]).update(expiry_alerted_at=timezone.now())
+
+    emails = []
+    for lot in lots:
+        product = lot.product
+        verb = 'expired' if lot.expiration_date < today else 'expires'
+        description = (f'{lot.remaining_quantity} units of {product.name} purchased on {lot.purchase_date} '
+                       f'{verb} on {lot.expiration_date}.')
+        notify.send(lot, recipient=product.responsible_user, verb='Expiry Notification', description=description,
+                    level='warning')
+        emails.append((product.responsible_user.email, 'Expiry Notification', description))
+
+    send_notification_emails.delay(emails)
+    return len(lots)
+
+
+@shared_task
+def prune_notifications():
+    return prune_read_notifications()
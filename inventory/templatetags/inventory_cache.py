@@ -0,0 +1,40 @@
+# templatetags/inventory_cache.py
+
+from django import template
+from django.utils import timezone
+
+from inventory.cache import get_or_compute
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, per_user):
+        self.nodelist = nodelist
+        self.name = name
+        self.per_user = per_user
+
+    def render(self, context):
+        user_id = None
+        if self.per_user:
+            request = getattr(context, 'request', None)
+            if request is None or not request.user.is_authenticated:
+                return self.nodelist.render(context)
+            user_id = request.user.pk
+        # The date keeps the "today" figures from outliving midnight, the versions do the rest
+        name = f'fragment:{self.name.resolve(context)}:{timezone.localdate()}'
+        return get_or_compute(name, lambda: self.nodelist.render(context), user_id=user_id)
+
+
+@register.tag
+def cached_fragment(parser, token):
+    """
+    Caches the enclosed markup under the inventory data version, or the user's version with `per_user`:
+    {% cached_fragment 'sidebar' per_user %}...{% endcached_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) not in (2, 3) or (len(bits) == 3 and bits[2] != 'per_user'):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and an optional 'per_user'")
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), len(bits) == 3)
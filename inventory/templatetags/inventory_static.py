@@ -0,0 +1,21 @@
+# templatetags/inventory_static.py
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from inventory.storage import BundledManifestStaticFilesStorage
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet_bundle(name):
+    # One fingerprinted file once collectstatic has built the bundle, the separate sources in development
+    if isinstance(staticfiles_storage, BundledManifestStaticFilesStorage):
+        paths = [name]
+    else:
+        paths = settings.INVENTORY_STATIC_BUNDLES[name]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((static(path),) for path in paths))
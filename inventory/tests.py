@@ -1,3 +1,1010 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, router, IntegrityError
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from notifications.models import Notification
+
+from goodsGuru.celery import app as celery_app
+from inventory.alerts import claim_low_stock_alerts
+from inventory.cache import bump_user_version, cache_stats, get_data_version, get_or_compute, get_user_version
+from inventory.context_processors import inventory_context
+from inventory.events import STOCK_CHANNEL, USER_CHANNEL, get_broker
+from inventory.forms import SaleForm
+from inventory.inbox import prune_read_notifications, unread_count
+from inventory.middleware import ReadYourWritesMiddleware, StaticAssetMiddleware
+from inventory.models import InventoryUser, InventorySummary, Supplier, Product, Purchase, Sale, SaleBatch, \
+    SalesDailyRollup, Stock
+from inventory.pagination import EstimatedCountPaginator, keyset_paginate
+from inventory.querycount import count_queries
+from inventory.routers import primary_reads, read_database, reporting_reads
+from inventory.summary import record_sales, remove_sale
+from inventory.tasks import send_low_stock_alerts, send_notification_emails, sweep_expiring_lots
+
+
+class InventoryTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The alert and email tasks run in-process so their notifications and emails can be checked
+        cls.addClassCleanup(celery_app.conf.update, CELERY_TASK_ALWAYS_EAGER=celery_app.conf.task_always_eager)
+        celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = InventoryUser.objects.create_user('manager@goodsguru.test', 'password',
+                                                     first_name='Store', last_name='Manager')
+        cls.supplier = Supplier.objects.create(name='Acme', contact_person='Jane', email='acme@goodsguru.test')
+        cls.products = [
+            Product.objects.create(name=f'Product {i}', category='Groceries', responsible_user=cls.user,
+                                   selling_price=10)
+            for i in range(5)
+        ]
+        for product in cls.products:
+            Purchase.objects.create(product=product, supplier=cls.supplier, quantity=50, acquisition_price=5,
+                                    expiration_date=date(2100, 1, 1))
+            Sale.objects.create(product=product, quantity=2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertQueryBudget(self, url_name, budget=None, **params):
+        # Pins the queries of a page to its INVENTORY_QUERY_BUDGETS entry, failing with the repeated SQL shapes
+        budget = settings.INVENTORY_QUERY_BUDGETS[url_name] if budget is None else budget
+        with count_queries() as queries:
+            response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(queries.count, budget, f'{url_name} ran {queries.describe()}')
+        return queries
+
+
+class InventoryCacheTests(InventoryTestCase):
+    def test_writes_bump_the_data_version_once_committed(self):
+        version = get_data_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Sale.objects.create(product=self.products[0], quantity=1)
+            self.assertEqual(get_data_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_data_version(), version)
+
+    def test_user_bump_only_invalidates_that_user(self):
+        other = InventoryUser.objects.create_user('clerk@goodsguru.test', 'password', first_name='Store',
+                                                  last_name='Clerk')
+        get_or_compute('name', lambda: 'manager', user_id=self.user.pk)
+        get_or_compute('name', lambda: 'clerk', user_id=other.pk)
+        other_version = get_user_version(other.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_user_version(self.user.pk)
+        self.assertEqual(get_user_version(other.pk), other_version)
+        self.assertEqual(get_or_compute('name', lambda: 'recomputed', user_id=self.user.pk), 'recomputed')
+        self.assertEqual(get_or_compute('name', lambda: 'recomputed', user_id=other.pk), 'clerk')
+
+    def test_stats_count_hits_and_misses(self):
+        get_or_compute('answer', lambda: 42)
+        get_or_compute('answer', lambda: 42)
+        get_or_compute('answer', lambda: 42)
+        self.assertEqual({key: cache_stats()[key] for key in ['hits', 'misses', 'hit_rate']},
+                         {'hits': 2, 'misses': 1, 'hit_rate': 0.6667})
+
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.json()['data_version'], get_data_version())
+        self.assertEqual(response.json()['hits'], 2)
+
+
+class LazyContextTests(InventoryTestCase):
+    def render(self, template_name):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return render_to_string(template_name, request=request)
+
+    def test_context_processor_runs_no_queries(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            inventory_context(request)
+
+    def test_nav_only_pays_for_notifications(self):
+        with self.assertNumQueries(1):
+            self.render('inventory/sidebar.html')
+        # The unread count is shared with the sidebar through the per-user cache
+        with self.assertNumQueries(1):
+            self.render('inventory/main_nav.html')
+
+    def test_stats_cards_are_served_from_cache(self):
+        with self.assertNumQueries(4):
+            self.render('inventory/stats_cards.html')
+        with self.assertNumQueries(0):
+            self.render('inventory/stats_cards.html')
+
+    def test_fragments_follow_the_data_and_user_versions(self):
+        self.assertIn('>100.00<', self.render('inventory/stats_cards.html'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(product=self.products[0], quantity=1)
+        self.assertIn('>110.00<', self.render('inventory/stats_cards.html'))
+
+        self.assertNotIn('Restock', self.render('inventory/main_nav.html'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(recipient=self.user, actor=self.user, verb='Restock')
+        self.assertIn('Restock', self.render('inventory/main_nav.html'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Renamed'
+            self.user.save()
+        self.assertIn('Renamed', self.render('inventory/sidebar.html'))
+
+    def test_pages_query_less_once_warm(self):
+        for name in ['home', 'sales', 'products', 'notifications']:
+            with self.subTest(page=name):
+                cache.clear()
+                with CaptureQueriesContext(connection) as cold:
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+                with CaptureQueriesContext(connection) as warm:
+                    self.client.get(reverse(name))
+                self.assertLess(len(warm), len(cold))
+
+
+class QueryBudgetTests(InventoryTestCase):
+    def test_pages_stay_within_their_query_budget(self):
+        for name in ['home', 'sales', 'products', 'notifications']:
+            with self.subTest(page=name):
+                cache.clear()
+                queries = self.assertQueryBudget(name)
+                self.assertEqual(queries.duplicates, {})
+
+    @override_settings(INVENTORY_QUERY_INSTRUMENTATION=True)
+    def test_middleware_reports_queries_in_headers(self):
+        response = self.client.get(reverse('sales'))
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertEqual(response['X-Duplicate-Queries'], '0')
+        with override_settings(INVENTORY_QUERY_BUDGETS={'sales': 1}), \
+                self.assertLogs('inventory.middleware', 'WARNING'):
+            self.client.get(reverse('sales'))
+
+    @override_settings(INVENTORY_QUERY_INSTRUMENTATION=False)
+    def test_middleware_is_silent_when_disabled(self):
+        self.assertNotIn('X-Query-Count', self.client.get(reverse('sales')))
+
+
+class NotificationInboxTests(InventoryTestCase):
+    def notify(self, count, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                Notification.objects.create(recipient=self.user, actor=self.products[0], verb='Test', **fields)
+
+    def unread(self):
+        return self.client.get(reverse('unread_notifications_count')).json()['unread']
+
+    def test_unread_count_follows_new_and_read_notifications(self):
+        self.assertEqual(self.unread(), 0)
+        self.notify(3)
+        with self.assertNumQueries(0):
+            unread_count(self.user.pk)
+        self.assertEqual(self.unread(), 3)
+
+        notification = Notification.objects.filter(recipient=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('mark_as_read', args=[notification.pk]))
+        self.assertEqual(self.unread(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(5):
+            self.client.post(reverse('mark_all_as_read'))
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.filter(unread=True).exists())
+
+    def test_mark_read_is_scoped_to_the_recipient(self):
+        other = InventoryUser.objects.create_user('other@goodsguru.test', 'password', first_name='O', last_name='U')
+        notification = Notification.objects.create(recipient=other, actor=self.products[0], verb='Test')
+        self.client.post(reverse('mark_as_read', args=[notification.pk]))
+        notification.refresh_from_db()
+        self.assertTrue(notification.unread)
+
+    def test_prune_deletes_only_old_read_notifications(self):
+        self.notify(2)
+        self.notify(2, unread=False)
+        Notification.objects.filter(unread=False).update(timestamp=timezone.now() - timedelta(days=100))
+        Notification.objects.filter(unread=True).update(timestamp=timezone.now() - timedelta(days=100))
+        self.assertEqual(prune_read_notifications(90, chunk_size=1), 2)
+        self.assertEqual(Notification.objects.filter(unread=True).count(), 2)
+
+
+class LiveEventsTests(InventoryTestCase):
+    def sell(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(product=self.products[0], quantity=quantity)
+
+    def test_committed_sale_reaches_subscribers(self):
+        async def listen():
+            async with get_broker().subscribe([STOCK_CHANNEL]) as subscription:
+                await sync_to_async(self.sell)(3)
+                return await asyncio.wait_for(subscription.get(), 1)
+
+        _, event = async_to_sync(listen)()
+        self.assertEqual(event, {'type': 'stock', 'product': self.products[0].pk, 'quantity': 45,
+                                 'low_stock': False})
+
+    async def test_stream_sends_the_users_notifications(self):
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response.status_code, 401)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        next_chunk = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        get_broker().publish(USER_CHANNEL.format(user_id=self.user.pk), {'type': 'notification', 'id': 1})
+        self.assertEqual(await asyncio.wait_for(next_chunk, 1),
+                         b'event: notification\ndata: {"type": "notification", "id": 1}\n\n')
+        await stream.aclose()
+
+    def test_wsgi_pages_do_not_open_the_stream(self):
+        self.assertNotIn(b'data-live-events', self.client.get(reverse('home')).content)
+        self.assertEqual(self.client.get(reverse('live_events')).status_code, 204)
+
+    async def test_asgi_pages_subscribe_to_the_stream(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, f'data-live-events="{reverse("live_events")}"')
+
+
+class StockApiTests(InventoryTestCase):
+    def test_detail_answers_not_modified_until_the_stock_changes(self):
+        url = reverse('stock_detail', args=[self.products[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['quantity'], 48)
+        etag = response['ETag']
+
+        with self.assertNumQueries(3):
+            # Session, user and the version lookup
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Sale.objects.create(product=self.products[0], quantity=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 47)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_batch_lookup(self):
+        ids = f'{self.products[1].pk},{self.products[0].pk},999'
+        response = self.client.get(reverse('stock_batch'), {'ids': ids})
+        self.assertEqual([stock['product'] for stock in response.json()['results']],
+                         [self.products[0].pk, self.products[1].pk])
+        self.assertEqual(self.client.get(reverse('stock_batch'), {'ids': ids},
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(reverse('stock_batch')).status_code, 400)
+        response = self.client.get(reverse('stock_batch'), {'ids': f'{self.products[0].pk},abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+        with self.settings(INVENTORY_MAX_PAGE_SIZE=1):
+            self.assertEqual(self.client.get(reverse('stock_batch'), {'ids': ids}).status_code, 400)
+
+    def test_renamed_product_changes_the_etag_and_the_changes_feed(self):
+        url = reverse('stock_detail', args=[self.products[0].pk])
+        etag = self.client.get(url)['ETag']
+        since = Stock.objects.order_by('-updated_at').values_list('updated_at', flat=True).first()
+
+        self.products[0].name = 'Renamed'
+        self.products[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Renamed')
+        response = self.client.get(reverse('stock_changes'), {'since': since.isoformat()})
+        self.assertEqual([stock['name'] for stock in response.json()['results']], ['Renamed'])
+
+    def test_changes_since(self):
+        since = Stock.objects.order_by('-updated_at').values_list('updated_at', flat=True).first()
+        Sale.objects.create(product=self.products[2], quantity=1)
+        response = self.client.get(reverse('stock_changes'), {'since': since.isoformat()})
+        self.assertEqual([stock['product'] for stock in response.json()['results']], [self.products[2].pk])
+        self.assertEqual(self.client.get(reverse('stock_changes'), {'since': 'yesterday'}).status_code, 400)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('stock_detail', args=[self.products[0].pk])).status_code, 401)
+
+
+class TypeaheadTests(InventoryTestCase):
+    def test_product_lookup_matches_prefixes_with_stock(self):
+        Sale.objects.create(product=self.products[2], quantity=48)
+        response = self.client.get(reverse('product_lookup'), {'q': 'product', 'in_stock': 1, 'limit': 2})
+        self.assertEqual(response.json()['results'], [
+            {'id': self.products[0].pk, 'text': 'Product 0', 'quantity': 48, 'low_stock': False},
+            {'id': self.products[1].pk, 'text': 'Product 1', 'quantity': 48, 'low_stock': False},
+        ])
+        response = self.client.get(reverse('product_lookup'), {'q': 'Product 2', 'in_stock': 1})
+        self.assertEqual(response.json()['results'], [])
+        response = self.client.get(reverse('user_lookup'), {'q': 'MANAGER'})
+        self.assertEqual(response.json()['results'], [{'id': self.user.pk, 'text': 'manager@goodsguru.test'}])
+
+    def test_sale_form_renders_only_the_selected_product(self):
+        with self.assertNumQueries(0):
+            html = str(SaleForm()['product'])
+        self.assertIn(f'data-typeahead="{reverse("product_lookup")}?in_stock=1"', html)
+        self.assertEqual(html.count('<option'), 1)
+
+        form = SaleForm({'product': self.products[1].pk, 'quantity': 1})
+        self.assertTrue(form.is_valid())
+        self.assertIn('<option value="%s" selected>Product 1</option>' % self.products[1].pk, str(form['product']))
+        Sale.objects.create(product=self.products[3], quantity=48)
+        self.assertFalse(SaleForm({'product': self.products[3].pk, 'quantity': 1}).is_valid())
+
+
+@override_settings(INVENTORY_READ_DATABASE='replica')
+class ReportingRouterTests(SimpleTestCase):
+    def test_only_reporting_reads_leave_the_primary(self):
+        self.assertEqual(router.db_for_read(Sale), 'default')
+        with reporting_reads():
+            self.assertEqual(router.db_for_read(Sale), 'replica')
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Sale), 'default')
+            self.assertEqual(router.db_for_write(Sale), 'default')
+
+    def test_writes_pin_the_browser_to_the_primary(self):
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse(read_database()))
+        request_factory = RequestFactory()
+        self.assertEqual(middleware(request_factory.get('/')).content, b'replica')
+
+        response = middleware(request_factory.post('/'))
+        self.assertEqual(response.content, b'default')
+        request = request_factory.get('/')
+        request.COOKIES[ReadYourWritesMiddleware.COOKIE_NAME] = response.cookies[
+            ReadYourWritesMiddleware.COOKIE_NAME].value
+        self.assertEqual(middleware(request).content, b'default')
+
+
+class AdminTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+
+    def test_changelists_do_not_query_per_row(self):
+        for name in ['sale', 'purchase', 'stock', 'product']:
+            with self.subTest(admin=name):
+                url = reverse(f'admin:inventory_{name}_changelist')
+                with CaptureQueriesContext(connection) as before:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                for product in self.products:
+                    Sale.objects.create(product=product, quantity=1)
+                    Purchase.objects.create(product=product, supplier=self.supplier, quantity=1, acquisition_price=5,
+                                            expiration_date=date(2100, 1, 1))
+                with CaptureQueriesContext(connection) as after:
+                    self.client.get(url)
+                self.assertEqual(len(after), len(before))
+
+    def test_search_and_autocomplete_use_product_names(self):
+        response = self.client.get(reverse('admin:inventory_sale_changelist'), {'q': 'Product 3'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'inventory', 'model_name': 'sale', 'field_name': 'product', 'term': 'Product 1'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Product 1'])
+
+    def test_large_unfiltered_tables_use_the_estimate(self):
+        sales = Sale.objects.order_by('pk')
+        self.assertEqual(EstimatedCountPaginator(sales, 10, estimate_threshold=1).count, sales.last().pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(EstimatedCountPaginator(sales.filter(quantity=2), 10, estimate_threshold=1).count, 5)
+
+    def test_pages_past_an_overestimate_fall_back_to_the_exact_count(self):
+        sales = Sale.objects.order_by('pk')
+        Sale.objects.exclude(pk=sales.last().pk).delete()
+        paginator = EstimatedCountPaginator(sales, 2, estimate_threshold=1)
+        self.assertGreater(paginator.num_pages, 1)
+        page = paginator.page(paginator.num_pages)
+        self.assertEqual((page.number, len(page), paginator.count, paginator.num_pages), (1, 1, 1, 1))
+
+    @override_settings(INVENTORY_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_changelist_clamps_pages_past_the_real_end(self):
+        for _ in range(20):
+            Sale.objects.create(product=self.products[0], quantity=1)
+        Sale.objects.filter(pk__in=Sale.objects.order_by('pk').values_list('pk', flat=True)[:15]).delete()
+        response = self.client.get(reverse('admin:inventory_sale_changelist'), {'p': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 10)
+
+
+class StaticAssetTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=cls.static_root, INVENTORY_SERVE_STATIC=True,
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'inventory.storage.BundledManifestStaticFilesStorage'}},
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_bundle_is_fingerprinted_and_keeps_imports_first(self):
+        html = Template("{% load inventory_static %}{% stylesheet_bundle 'css/theme.css' %}").render(Context())
+        self.assertRegex(html, r'^<link rel="stylesheet" href="/static/css/theme\.[0-9a-f]{12}\.css">$')
+        with staticfiles_storage.open(staticfiles_storage.stored_name('css/theme.css')) as file:
+            self.assertTrue(file.read().startswith(b'@import'))
+
+    def test_theme_loads_after_font_awesome(self):
+        html = render_to_string('inventory/home_partial.html')
+        stylesheets = re.findall(r'<link rel="stylesheet" href="([^"]+)"', html)
+        font_awesome = next(i for i, href in enumerate(stylesheets) if 'font-awesome' in href)
+        self.assertRegex(stylesheets[font_awesome - 1], r'/static/css/inventory\.[0-9a-f]{12}\.css$')
+        self.assertRegex(stylesheets[font_awesome + 1], r'/static/css/theme\.[0-9a-f]{12}\.css$')
+
+    def test_hashed_assets_are_served_precompressed_and_immutable(self):
+        middleware = StaticAssetMiddleware(lambda request: HttpResponse(status=404))
+        name = Template("{% load static %}{% static 'js/script.js' %}").render(Context())
+        response = middleware(RequestFactory().get(name, HTTP_ACCEPT_ENCODING='gzip, deflate'))
+        self.addCleanup(response.close)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = middleware(RequestFactory().get('/static/js/script.js'))
+        self.addCleanup(response.close)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(middleware(RequestFactory().get('/static/missing.js')).status_code, 404)
+
+
+class SummaryTests(InventoryTestCase):
+    def assertSummary(self, total_sales, total_revenue, total_stock_quantity):
+        summary = InventorySummary.load()
+        self.assertEqual((summary.total_sales, summary.total_revenue, summary.total_stock_quantity),
+                         (total_sales, total_revenue, total_stock_quantity))
+
+    def test_totals_follow_sales_purchases_and_stock_edits(self):
+        self.assertSummary(5, 100, 240)
+        Sale.objects.create(product=self.products[0], quantity=3)
+        self.assertSummary(6, 130, 237)
+
+        purchase = Purchase.objects.filter(product=self.products[1]).get()
+        purchase.quantity = 60
+        purchase.save()
+        self.assertSummary(6, 130, 247)
+
+        stock = Stock.objects.get(product=self.products[2])
+        stock.quantity = 40
+        stock.save()
+        self.assertSummary(6, 130, 239)
+        stock.delete()
+        self.assertSummary(6, 130, 199)
+
+    def test_rebuild_command_recomputes_from_the_tables(self):
+        InventorySummary.objects.update(total_sales=0, total_revenue=0, total_stock_quantity=0)
+        call_command('rebuild_inventory_summary', stdout=StringIO())
+        self.assertSummary(5, 100, 240)
+
+
+class SaleTests(InventoryTestCase):
+    def test_sale_takes_stock_once(self):
+        product = self.products[0]
+        Sale.objects.create(product=product, quantity=3)
+        self.assertEqual(Stock.objects.get(product=product).quantity, 45)
+
+    def test_sale_cannot_oversell(self):
+        product = self.products[0]
+        with self.assertRaises(ValidationError):
+            Sale.objects.create(product=product, quantity=49)
+        self.assertEqual(Stock.objects.get(product=product).quantity, 48)
+        self.assertEqual(Sale.objects.filter(product=product).count(), 1)
+
+    def test_sale_flags_low_stock_from_returned_quantity(self):
+        sale = Sale.objects.create(product=self.products[0], quantity=40)
+        self.assertTrue(sale.low_stock)
+        self.assertEqual(sale.remaining_stock, 8)
+
+    def test_editing_sale_product_moves_stock_lots_and_totals(self):
+        old_product, new_product = self.products[0], self.products[1]
+        sale = Sale.objects.get(product=old_product)
+        sale.product = new_product
+        sale.quantity = 5
+        sale.save()
+
+        sale.refresh_from_db()
+        self.assertEqual(sale.selling_price, 50)
+        for product, quantity in [(old_product, 50), (new_product, 43)]:
+            with self.subTest(product=product.name):
+                self.assertEqual(Stock.objects.get(product=product).quantity, quantity)
+                self.assertEqual(Purchase.objects.get(product=product).remaining_quantity, quantity)
+        summary = InventorySummary.load()
+        self.assertEqual((summary.total_sales, summary.total_revenue, summary.total_stock_quantity), (5, 130, 237))
+        rollups = dict(SalesDailyRollup.objects.filter(product__in=[old_product, new_product])
+                       .values_list('product_id', 'quantity'))
+        self.assertEqual(rollups, {old_product.pk: 0, new_product.pk: 7})
+
+    def test_deleting_product_with_sales_drops_its_rollups(self):
+        product = self.products[0]
+        product.delete()
+        self.assertFalse(Sale.objects.filter(product_id=product.pk).exists())
+        self.assertFalse(SalesDailyRollup.objects.filter(product_id=product.pk).exists())
+
+
+class SalesRollupTests(InventoryTestCase):
+    def sell(self, product, quantity, sale_date):
+        return Sale.objects.create(product=product, quantity=quantity, sale_date=sale_date)
+
+    def rollups(self):
+        return {(row.date, row.product_id): (row.sales_count, row.quantity, row.revenue)
+                for row in SalesDailyRollup.objects.filter(date__lt=date(2025, 1, 1))}
+
+    def test_record_sales_folds_per_day_and_product(self):
+        product = self.products[0]
+        record_sales([Sale(product=product, quantity=1, selling_price=10, sale_date=date(2024, 1, 3)),
+                      Sale(product=product, quantity=2, selling_price=20, sale_date=date(2024, 1, 3)),
+                      Sale(product=product, quantity=3, selling_price=30, sale_date=date(2024, 1, 4))])
+        self.assertEqual(self.rollups(), {(date(2024, 1, 3), product.pk): (2, 3, 30),
+                                          (date(2024, 1, 4), product.pk): (1, 3, 30)})
+        summary = InventorySummary.load()
+        self.assertEqual((summary.total_sales, summary.total_revenue), (8, 160))
+
+    def test_deleted_sales_are_removed_from_their_day(self):
+        product = self.products[0]
+        first = self.sell(product, 1, date(2024, 1, 3))
+        self.sell(product, 2, date(2024, 1, 3))
+        first.delete()
+        self.assertEqual(self.rollups(), {(date(2024, 1, 3), product.pk): (1, 2, 20)})
+        remove_sale(Sale(product=product, quantity=2, selling_price=20, sale_date=date(2024, 1, 3)))
+        self.assertEqual(self.rollups(), {(date(2024, 1, 3), product.pk): (0, 0, 0)})
+
+    def test_rebuild_only_touches_the_requested_range(self):
+        product = self.products[0]
+        self.sell(product, 1, date(2024, 1, 3))
+        self.sell(product, 2, date(2024, 2, 3))
+        SalesDailyRollup.objects.update(quantity=99)
+        call_command('rebuild_sales_rollup', start='2024-02-01', end='2024-02-28', stdout=StringIO())
+        self.assertEqual(self.rollups(), {(date(2024, 1, 3), product.pk): (1, 99, 10),
+                                          (date(2024, 2, 3), product.pk): (1, 2, 20)})
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        self.assertEqual(SalesDailyRollup.objects.get(date=date(2024, 1, 3)).quantity, 1)
+        self.assertEqual(SalesDailyRollup.objects.exclude(date__lt=date(2025, 1, 1)).get(
+            product=product).quantity, 2)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales_rollup', '--start', 'last week', stdout=StringIO(), stderr=StringIO())
+
+    def test_trends_are_bucketed_from_the_rollups(self):
+        self.sell(self.products[1], 1, date(2024, 1, 3))
+        self.sell(self.products[1], 2, date(2024, 1, 20))
+        self.sell(self.products[2], 3, date(2024, 2, 1))
+
+        response = self.client.get(reverse('sales_trends'), {'bucket': 'month', 'start': '2024-01-01',
+                                                             'end': '2024-12-31'})
+        self.assertEqual([(row['period'], row['sales_count'], row['quantity'], Decimal(row['revenue']))
+                          for row in response.json()['series']],
+                         [('2024-01-01', 2, 3, 30), ('2024-02-01', 1, 3, 30)])
+
+        response = self.client.get(reverse('sales_trends'), {'bucket': 'week', 'product': self.products[1].pk,
+                                                             'end': '2024-12-31'})
+        self.assertEqual([row['period'] for row in response.json()['series']], ['2024-01-01', '2024-01-15'])
+
+    def test_trends_reject_unknown_buckets(self):
+        response = self.client.get(reverse('sales_trends'), {'bucket': 'fortnight'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'errors': ['bucket must be one of day, week, month, year.']})
+
+
+class StockTests(InventoryTestCase):
+    def test_one_stock_row_per_product(self):
+        with self.assertRaises(IntegrityError):
+            Stock.objects.create(product=self.products[0], quantity=1)
+
+    def test_low_stock_is_evaluated_in_memory(self):
+        stocks = list(Stock.objects.all())
+        with self.assertNumQueries(0):
+            self.assertEqual([stock.is_low_stock() for stock in stocks], [False] * 5)
+        Sale.objects.create(product=self.products[0], quantity=40)
+        self.assertEqual(list(Stock.objects.low_stock().values_list('product', flat=True)), [self.products[0].pk])
+
+
+class SaleBatchTests(InventoryTestCase):
+    def post_batch(self, key, lines):
+        return self.client.post(reverse('sales_batch'), json.dumps({'lines': lines}),
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_batch_aggregates_lines_per_product(self):
+        product = self.products[0]
+        response = self.post_batch('register-1', [{'product': product.pk, 'quantity': 2},
+                                                  {'product': product.pk, 'quantity': 3}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['sales_count'], 2)
+        self.assertEqual(Stock.objects.get(product=product).quantity, 43)
+
+    def test_retried_batch_is_a_no_op(self):
+        product = self.products[0]
+        self.post_batch('register-1', [{'product': product.pk, 'quantity': 2}])
+        response = self.post_batch('register-1', [{'product': product.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['replayed'])
+        self.assertEqual(Stock.objects.get(product=product).quantity, 46)
+
+    def test_batch_is_rejected_as_a_whole(self):
+        response = self.post_batch('register-1', [{'product': self.products[0].pk, 'quantity': 2},
+                                                  {'product': self.products[1].pk, 'quantity': 100}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Stock.objects.get(product=self.products[0]).quantity, 48)
+        self.assertFalse(SaleBatch.objects.exists())
+
+    def test_bad_sale_dates_are_rejected_per_line(self):
+        product = self.products[0]
+        response = self.post_batch('register-1', [{'product': product.pk, 'quantity': 1, 'sale_date': '2024-02-30'},
+                                                  {'product': product.pk, 'quantity': 1, 'sale_date': 20240101},
+                                                  {'product': product.pk, 'quantity': 1, 'sale_date': 'yesterday'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 3)
+        self.assertIn('Line 2: sale_date', response.json()['errors'][1])
+        self.assertEqual(Stock.objects.get(product=product).quantity, 48)
+
+
+class LowStockAlertTests(InventoryTestCase):
+    def sell(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(product=self.products[0], quantity=quantity)
+
+    def test_one_alert_per_low_stock_episode(self):
+        self.sell(40)
+        self.sell(1)
+        self.sell(1)
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(INVENTORY_LOW_STOCK_ALERT_COOLDOWN=0)
+    def test_purchase_above_threshold_rearms_the_alert(self):
+        self.sell(40)
+        Purchase.objects.create(product=self.products[0], supplier=self.supplier, quantity=20, acquisition_price=5,
+                                expiration_date=date(2100, 1, 1))
+        self.assertTrue(Stock.objects.get(product=self.products[0]).low_stock_alert_armed)
+        self.sell(20)
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 2)
+
+    @override_settings(INVENTORY_LOW_STOCK_ALERT_COOLDOWN=0)
+    def test_sale_edited_down_rearms_the_alert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(product=self.products[0], quantity=40)
+        sale.quantity = 10
+        sale.save()
+        self.assertTrue(Stock.objects.get(product=self.products[0]).low_stock_alert_armed)
+        self.sell(30)
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 2)
+
+    @override_settings(INVENTORY_LOW_STOCK_ALERT_COOLDOWN=0)
+    def test_stock_given_back_by_other_paths_rearms_the_alert(self):
+        self.sell(40)
+        stock = Stock.objects.get(product=self.products[0])
+        stock.quantity = 30
+        stock.save()
+        self.assertTrue(Stock.objects.get(pk=stock.pk).low_stock_alert_armed)
+
+        self.sell(25)
+        Stock.objects.filter(pk=stock.pk).update(low_stock_alert_armed=False)
+        sale = Sale.objects.filter(product=self.products[0]).latest('pk')
+        sale.product = self.products[1]
+        sale.save()
+        self.assertTrue(Stock.objects.get(pk=stock.pk).low_stock_alert_armed)
+
+    def test_cooldown_holds_back_a_rearmed_alert(self):
+        self.sell(40)
+        Purchase.objects.create(product=self.products[0], supplier=self.supplier, quantity=20, acquisition_price=5,
+                                expiration_date=date(2100, 1, 1))
+        self.sell(20)
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 1)
+
+    def test_alert_is_claimed_and_queued_once(self):
+        product_id = self.products[0].pk
+        Stock.objects.filter(product_id=product_id).update(quantity=5)
+        self.assertEqual(claim_low_stock_alerts([product_id]), [product_id])
+        self.assertEqual(claim_low_stock_alerts([product_id]), [])
+
+        Stock.objects.filter(product_id=product_id).update(low_stock_alert_armed=True, low_stock_alerted_at=None)
+        with mock.patch.object(send_low_stock_alerts, 'delay') as delay:
+            self.sell(1)
+            self.sell(1)
+        delay.assert_called_once_with([product_id])
+
+    def test_emails_share_one_smtp_connection(self):
+        emails = [('a@goodsguru.test', 'Low Stock Notification', 'Low'),
+                  ('b@goodsguru.test', 'Low Stock Notification', 'Low')]
+        with mock.patch('inventory.tasks.get_connection', wraps=get_connection) as connect:
+            send_notification_emails.delay(emails)
+        connect.assert_called_once_with()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIs(mail.outbox[0].connection, mail.outbox[1].connection)
+
+    def test_emails_are_retried_on_smtp_errors(self):
+        connection = mock.MagicMock()
+        connection.__enter__.return_value = connection
+        connection.send_messages.side_effect = [SMTPException('busy'), 1]
+        with mock.patch('inventory.tasks.get_connection', return_value=connection):
+            send_notification_emails.delay([('a@goodsguru.test', 'Low Stock Notification', 'Low')])
+        self.assertEqual(connection.send_messages.call_count, 2)
+        self.assertEqual(Notification.objects.count(), 0)
+
+
+class LotTests(InventoryTestCase):
+    def receive(self, quantity, expiration_date):
+        return Purchase.objects.create(product=self.products[0], supplier=self.supplier, quantity=quantity,
+                                       acquisition_price=5, expiration_date=expiration_date)
+
+    def test_sales_consume_the_earliest_expiring_lot_first(self):
+        early = self.receive(10, date(2099, 1, 1))
+        Sale.objects.create(product=self.products[0], quantity=12)
+        early.refresh_from_db()
+        self.assertEqual(early.remaining_quantity, 0)
+        self.assertEqual(Purchase.objects.get(product=self.products[0], expiration_date=date(2100, 1, 1))
+                         .remaining_quantity, 46)
+
+    def test_next_expiry_follows_the_open_lots(self):
+        product = self.products[0]
+        self.receive(10, date(2099, 1, 1))
+        product.refresh_from_db()
+        self.assertEqual(product.next_expiry, date(2099, 1, 1))
+
+        sale = Sale.objects.create(product=product, quantity=10)
+        product.refresh_from_db()
+        self.assertEqual(product.next_expiry, date(2100, 1, 1))
+
+        sale.quantity = 4
+        sale.save()
+        self.assertEqual(sum(Purchase.objects.filter(product=product).values_list('remaining_quantity', flat=True)),
+                         Stock.objects.get(product=product).quantity)
+
+    def test_purchase_edits_move_stock_and_the_lot_by_the_difference(self):
+        product = self.products[0]
+        purchase = Purchase.objects.get(product=product)
+        for quantity, stock in [(60, 58), (30, 28), (2, 0)]:
+            with self.subTest(quantity=quantity):
+                purchase.quantity = quantity
+                purchase.save()
+                purchase.refresh_from_db()
+                self.assertEqual(purchase.remaining_quantity, stock)
+                self.assertEqual(Stock.objects.get(product=product).quantity, stock)
+                self.assertEqual(InventorySummary.load().total_stock_quantity, 192 + stock)
+
+        purchase.quantity = 1
+        with self.assertRaises(ValidationError):
+            purchase.full_clean()
+        with self.assertRaises(ValidationError):
+            purchase.save()
+
+    def test_unsold_purchase_can_move_to_another_product(self):
+        old_product, new_product = self.products[0], self.products[1]
+        lot = self.receive(10, date(2099, 1, 1))
+        lot.product = new_product
+        lot.save()
+        self.assertEqual(Stock.objects.get(product=old_product).quantity, 48)
+        self.assertEqual(Stock.objects.get(product=new_product).quantity, 58)
+        old_product.refresh_from_db()
+        self.assertEqual(old_product.next_expiry, date(2100, 1, 1))
+
+        lot = Purchase.objects.get(product=old_product)
+        lot.product = new_product
+        with self.assertRaises(ValidationError):
+            lot.save()
+
+    def test_sweeper_reports_each_expiring_lot_once(self):
+        today = timezone.now().date()
+        self.receive(10, today + timedelta(days=3))
+        self.receive(10, today + timedelta(days=300))
+        self.assertEqual(sweep_expiring_lots(), 1)
+        self.assertEqual(sweep_expiring_lots(), 0)
+        self.assertEqual(Notification.objects.filter(verb='Expiry Notification').count(), 1)
+
+
+class BenchmarkInventoryTests(InventoryTestCase):
+    def test_benchmark_leaves_the_data_and_the_shared_cache_alone(self):
+        Purchase.objects.create(product=self.products[0], supplier=self.supplier, quantity=10, acquisition_price=5,
+                                expiration_date=date(2100, 1, 1))
+        cache.set('session:someone-else', 'kept')
+        data_version = get_data_version()
+        sales = Sale.objects.count()
+
+        stdout = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('benchmark_inventory', runs=1, stdout=stdout)
+        results = json.loads(stdout.getvalue())
+
+        self.assertEqual(sorted(results['views']), sorted(f'{name}:{state}' for name in
+                                                          ['home', 'sales', 'products', 'notifications', 'sales_trends']
+                                                          for state in ['cold', 'warm']))
+        self.assertEqual(sorted(results['writes']), ['purchase', 'sale', 'sale_batch_20_lines'])
+        self.assertEqual(Sale.objects.count(), sales)
+        self.assertEqual(cache.get('session:someone-else'), 'kept')
+        self.assertGreater(get_data_version(), data_version)
+
+
+class SeedInventoryTests(TestCase):
+    def test_seeded_data_is_consistent(self):
+        call_command('seed_inventory', users=2, suppliers=2, products=10, purchases=40, sales=300, notifications=20,
+                     stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(Notification.objects.count(), 20)
+        for product in Product.objects.select_related('stock'):
+            with self.subTest(product=product.name):
+                lots = Purchase.objects.filter(product=product)
+                sold = sum(Sale.objects.filter(product=product).values_list('quantity', flat=True))
+                self.assertEqual(product.stock.quantity, sum(lot.remaining_quantity for lot in lots))
+                self.assertEqual(product.stock.quantity, sum(lot.quantity for lot in lots) - sold)
+        self.assertEqual(InventorySummary.load().total_sales, Sale.objects.count())
+
+
+class SalesExportTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk=self.products[4].pk).update(category='Books')
+        Sale.objects.filter(product=self.products[0]).update(sale_date=date(2020, 1, 15))
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_sales'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_a_header_and_one_row_per_sale(self):
+        lines = self.export().splitlines()
+        self.assertEqual(lines[0], 'id,sale_date,product_id,product,category,quantity,list_price,selling_price')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].endswith(f',2020-01-15,{self.products[0].pk},Product 0,Groceries,2,10.00,20.00'))
+
+    def test_jsonl_rows_follow_the_date_product_and_category_filters(self):
+        rows = [json.loads(line) for line in self.export(format='jsonl', end='2020-12-31').splitlines()]
+        self.assertEqual([row['product'] for row in rows], ['Product 0'])
+        rows = [json.loads(line) for line in self.export(format='jsonl', start='2021-01-01').splitlines()]
+        self.assertEqual(len(rows), 4)
+        rows = [json.loads(line) for line in self.export(format='jsonl', product=self.products[1].pk).splitlines()]
+        self.assertEqual([row['product_id'] for row in rows], [self.products[1].pk])
+        rows = [json.loads(line) for line in self.export(format='jsonl', category='Books').splitlines()]
+        self.assertEqual([row['product'] for row in rows], ['Product 4'])
+
+    def test_unknown_format_is_rejected_without_echoing_it(self):
+        response = self.client.get(reverse('export_sales'), {'format': '<script>alert(1)</script>'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertNotIn(b'<script>', response.content)
+
+    def test_command_writes_the_filtered_ledger(self):
+        stdout = StringIO()
+        call_command('export_sales', format='jsonl', category='Books', stdout=stdout)
+        self.assertEqual([json.loads(line)['product'] for line in stdout.getvalue().splitlines()], ['Product 4'])
+
+        stdout = StringIO()
+        call_command('export_sales', '--end', '2020-12-31', stdout=stdout)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 2)
+        with self.assertRaises(CommandError):
+            call_command('export_sales', '--start', '2020-02-30', stdout=StringIO(), stderr=StringIO())
+
+
+class ImportPurchasesTests(InventoryTestCase):
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f'{directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_csv_rows_update_stock_lots_and_create_related_rows(self):
+        path = self.write('purchases.csv', (
+            'product,supplier,quantity,acquisition_price,expiration_date,category,selling_price,responsible_user,'
+            'supplier_email\n'
+            'Product 0,Acme,10,5,2100-01-01,,,,\n'
+            f'{self.products[1].pk},Acme,5,5,2100-01-01,,,,\n'
+            'Tea,Leafy,7,3,2100-01-01,Groceries,6,manager@goodsguru.test,leafy@goodsguru.test\n'
+        ))
+        call_command('import_purchases', path, chunk_size=2, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Stock.objects.get(product=self.products[0]).quantity, 58)
+        self.assertEqual(Stock.objects.get(product=self.products[1]).quantity, 53)
+        tea = Product.objects.get(name='Tea')
+        self.assertEqual(tea.stock.quantity, 7)
+        self.assertEqual(Purchase.objects.get(product=tea).supplier.name, 'Leafy')
+        self.assertEqual(InventorySummary.load().total_stock_quantity, 240 + 22)
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        path = self.write('purchases.jsonl', '\n'.join([
+            json.dumps({'product': 'Product 0', 'supplier': 'Acme', 'quantity': 4, 'acquisition_price': 5,
+                        'expiration_date': '2100-01-01'}),
+            json.dumps({'product': 'Product 0', 'supplier': 'Acme', 'quantity': 4, 'acquisition_price': 5,
+                        'expiration_date': '2100-02-30'}),
+            json.dumps({'product': 'Product 0', 'supplier': 'Acme', 'quantity': 4, 'acquisition_price': 5,
+                        'expiration_date': '2100-01-01', 'purchase_date': '2024-13-01'}),
+            'not json',
+        ]))
+        stderr = StringIO()
+        call_command('import_purchases', path, stdout=StringIO(), stderr=stderr)
+        self.assertEqual(Stock.objects.get(product=self.products[0]).quantity, 52)
+        self.assertIn('Row 2: expiration_date must be a YYYY-MM-DD date', stderr.getvalue())
+        self.assertIn('Row 3: purchase_date must be a YYYY-MM-DD date', stderr.getvalue())
+        self.assertIn('Row 4: not a JSON object', stderr.getvalue())
+
+    def test_rejected_rows_create_no_products_or_suppliers(self):
+        path = self.write('purchases.jsonl', '\n'.join([
+            json.dumps({'product': 'Tea', 'supplier': 'Nobody', 'quantity': 7, 'acquisition_price': 3,
+                        'expiration_date': '2100-01-01', 'category': 'Groceries', 'selling_price': 6,
+                        'responsible_user': 'manager@goodsguru.test'}),
+            json.dumps({'product': 'Coffee', 'supplier': 'Beans', 'quantity': 3.7, 'acquisition_price': 3,
+                        'expiration_date': '2100-01-01', 'category': 'Groceries', 'selling_price': 6,
+                        'responsible_user': 'manager@goodsguru.test', 'supplier_email': 'beans@goodsguru.test'}),
+            json.dumps({'product': 'Product 0', 'supplier': 'Acme', 'quantity': 4.0, 'acquisition_price': 5,
+                        'expiration_date': '2100-01-01'}),
+        ]))
+        stderr = StringIO()
+        call_command('import_purchases', path, stdout=StringIO(), stderr=stderr)
+        self.assertIn('Row 1: unknown supplier "Nobody"', stderr.getvalue())
+        self.assertIn('Row 2: quantity and acquisition_price are required numbers', stderr.getvalue())
+        self.assertFalse(Product.objects.filter(name__in=['Tea', 'Coffee']).exists())
+        self.assertFalse(Supplier.objects.filter(name='Beans').exists())
+        self.assertEqual(Stock.objects.get(product=self.products[0]).quantity, 52)
+
+    def test_strict_import_keeps_nothing_from_the_failed_chunk(self):
+        path = self.write('purchases.csv', (
+            'product,supplier,quantity,acquisition_price,expiration_date,category,selling_price,responsible_user,'
+            'supplier_email\n'
+            'Tea,Leafy,7,3,2100-01-01,Groceries,6,manager@goodsguru.test,leafy@goodsguru.test\n'
+            'Product 0,Acme,10,5,2100-02-30,,,,\n'
+        ))
+        with self.assertRaisesMessage(CommandError, 'Row 2: expiration_date'):
+            call_command('import_purchases', path, strict=True, stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Product.objects.filter(name='Tea').exists())
+        self.assertFalse(Supplier.objects.filter(name='Leafy').exists())
+
+
+class KeysetPaginationTests(InventoryTestCase):
+    def test_pages_cover_every_row_once(self):
+        request_factory = RequestFactory()
+        ordering = ['-sale_date', '-id']
+        expected = list(Sale.objects.order_by(*ordering).values_list('id', flat=True))
+
+        page = keyset_paginate(request_factory.get('/', {'page_size': 2}), Sale.objects.all(), ordering)
+        seen = [sale.id for sale in page]
+        while page.next_link:
+            page = keyset_paginate(request_factory.get(f'/{page.next_link}'), Sale.objects.all(), ordering)
+            seen += [sale.id for sale in page]
+        self.assertEqual(seen, expected)
+
+    def test_listing_query_count_does_not_grow_with_rows(self):
+        for name in ['home', 'sales', 'products', 'notifications']:
+            with self.subTest(page=name):
+                self.client.get(reverse(name))
+                with CaptureQueriesContext(connection) as few_rows:
+                    self.client.get(reverse(name), {'page_size': 1})
+                with CaptureQueriesContext(connection) as more_rows:
+                    self.client.get(reverse(name), {'page_size': 5})
+                self.assertEqual(len(few_rows), len(more_rows))
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_an_index(self):
+        call_command('check_query_plans', stdout=StringIO())
+
+    def test_filtered_query_reading_a_whole_index_fails(self):
+        # LIKE can't seek the name index, the plan only reads it in order
+        queries = {'istartswith': Product.objects.filter(name__istartswith='a').order_by('name')[:10]}
+        with mock.patch('inventory.management.commands.check_query_plans.hot_queries', return_value=queries):
+            with self.assertRaisesMessage(CommandError, 'istartswith'):
+                call_command('check_query_plans', stdout=StringIO())
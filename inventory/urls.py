@@ -1,6 +1,8 @@
 from django.urls import path
 
-from .views import RegisterView, home, loginPage, logout_view, notifications, sales, products_listing
+from .views import RegisterView, home, loginPage, logout_view, notifications, sales, products_listing, \
+    inventory_cache_stats, sales_batch, export_sales, sales_trends, mark_as_read, mark_all_as_read, \
+    unread_notifications_count, live_events, stock_detail, stock_batch, stock_changes, product_lookup, user_lookup
 
 urlpatterns = [
     path('', home, name='home'),
@@ -8,6 +10,19 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('logout/', logout_view, name='logout'),
     path('notifications/', notifications, name='notifications'),
+    path('notifications/<int:notification_id>/read/', mark_as_read, name='mark_as_read'),
+    path('notifications/read-all/', mark_all_as_read, name='mark_all_as_read'),
+    path('notifications/unread-count/', unread_notifications_count, name='unread_notifications_count'),
     path('sales/', sales, name='sales'),
-    path('products/', products_listing, name='products')
+    path('sales/batch/', sales_batch, name='sales_batch'),
+    path('sales/export/', export_sales, name='export_sales'),
+    path('sales/trends/', sales_trends, name='sales_trends'),
+    path('products/', products_listing, name='products'),
+    path('events/', live_events, name='live_events'),
+    path('api/stock/', stock_batch, name='stock_batch'),
+    path('api/stock/changes/', stock_changes, name='stock_changes'),
+    path('api/stock/<int:product_id>/', stock_detail, name='stock_detail'),
+    path('api/lookup/products/', product_lookup, name='product_lookup'),
+    path('api/lookup/users/', user_lookup, name='user_lookup'),
+    path('cache-stats/', inventory_cache_stats, name='cache_stats'),
 ]
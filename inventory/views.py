@@ -1,17 +1,46 @@
+import hashlib
+import json
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.models import LogEntry, ADDITION
 from django.contrib.auth import login, authenticate, logout
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
+from django.db.models import Count, Max
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.generic import CreateView
 from notifications.admin import Notification
 
+from inventory.batches import record_sale_batch
+from inventory.cache import cache_stats
+from inventory.decorators import api_login_required
+from inventory.events import event_stream
+from inventory.exports import EXPORT_FORMATS, sales_ledger
+from inventory.inbox import mark_read, unread_count
 from inventory.forms import UserCreationForm, SaleForm, ProductForm
-from inventory.models import Sale, Stock, Product
+from inventory.models import Sale, Stock, Product, User
+from inventory.pagination import keyset_paginate
+from inventory.routers import read_database, reporting_reads
+from inventory.search import prefix_search
+from inventory.summary import SERIES_BUCKETS, sales_series
+
+
+def _date_param(request, name):
+    try:
+        return parse_date(request.GET.get(name) or '')
+    except ValueError:
+        return None
 
 
 # Create your views here.
@@ -48,6 +77,7 @@ def loginPage(request):
 
 
 @login_required(login_url='login')
+@reporting_reads()
 def home(request):
     if request.method == "POST":
         form = ProductForm(request.POST)
@@ -57,10 +87,14 @@ def home(request):
     else:
         form = ProductForm()
 
-    stock = Stock.objects.all()
+    stock = Stock.objects.select_related('product__responsible_user')
+    category = request.GET.get('category')
+    if category:
+        stock = stock.filter(product__category=category)
 
     context = {
-        'stock': stock,
+        'stock': keyset_paginate(request, stock, ['id']),
+        'categories': Product.CATEGORY_CHOICES,
         'main_title': 'Goods Guru Stock',
         'form': form
     }
@@ -68,10 +102,14 @@ def home(request):
 
 
 @login_required(login_url='login')
+@reporting_reads()
 def notifications(request):
     user_notifications = Notification.objects.filter(recipient=request.user)
+    listed_notifications = user_notifications
+    if request.GET.get('unread'):
+        listed_notifications = listed_notifications.filter(unread=True)
     context = {
-        'notifications': user_notifications,
+        'notifications': keyset_paginate(request, listed_notifications, ['-timestamp', '-id']),
         'unread_notifications': user_notifications.filter(unread=True),
         'currentYear': datetime.now().year,
         'main_title': 'Notifications'
@@ -79,53 +117,157 @@ def notifications(request):
     return render(request, 'inventory/notifications.html', context)
 
 
+@require_POST
 @login_required(login_url='login')
 def mark_as_read(request, notification_id):
-    notification = Notification.objects.get(id=notification_id)
-    notification.unread = False
-    notification.save()
+    mark_read(request.user, [notification_id])
     return redirect(to='notifications')
 
 
+@require_POST
 @login_required(login_url='login')
 def mark_all_as_read(request):
-    user_notifications = Notification.objects.filter(recipient=request.user)
-    for notification in user_notifications:
-        notification.unread = False
-        notification.save()
+    mark_read(request.user)
     return redirect(to='notifications')
 
 
+async def live_events(request):
+    # Long lived server-sent events stream, only served under ASGI (goodsGuru/asgi.py).
+    # login_required does not wrap async views in this Django version, hence the explicit check.
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would buffer the endless stream and hold a worker thread for it,
+        # 204 tells EventSource to stop reconnecting
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_login_required
+def unread_notifications_count(request):
+    # Polled by the nav badge, answered from the per user counter without touching the notifications table
+    return JsonResponse({'unread': unread_count(request.user.pk)})
+
+
 @login_required(login_url='login')
+@reporting_reads()
 def sales(request):
     if request.method == 'POST':
         form = SaleForm(request.POST)
         if form.is_valid():
-            sale = form.save()
-            # Create a LogEntry to log the sale creation action
-            content_type = ContentType.objects.get_for_model(sale)
-            LogEntry.objects.create(
-                user_id=request.user.id,
-                content_type_id=content_type.id,
-                object_id=sale.id,
-                object_repr=str(sale),
-                action_flag=ADDITION,
-                change_message=f'Sale added - Product: {sale.product}, Quantity: {sale.quantity}, Amount: {sale.selling_price}',
-                action_time=sale.sale_date,
-            )
-            return redirect(to='home')
+            try:
+                sale = form.save()
+            except ValidationError as error:
+                # Stock was taken by a concurrent sale after the form was validated
+                form.add_error(None, error)
+            else:
+                # Create a LogEntry to log the sale creation action
+                content_type = ContentType.objects.get_for_model(sale)
+                LogEntry.objects.create(
+                    user_id=request.user.id,
+                    content_type_id=content_type.id,
+                    object_id=sale.id,
+                    object_repr=str(sale),
+                    action_flag=ADDITION,
+                    change_message=f'Sale added - Product: {sale.product}, Quantity: {sale.quantity}, Amount: {sale.selling_price}',
+                    action_time=sale.sale_date,
+                )
+                return redirect(to='home')
     else:
         form = SaleForm()
-    sales = Sale.objects.all()
+    sales = Sale.objects.select_related('product')
+    start_date = _date_param(request, 'start')
+    end_date = _date_param(request, 'end')
+    if start_date:
+        sales = sales.filter(sale_date__gte=start_date)
+    if end_date:
+        sales = sales.filter(sale_date__lte=end_date)
+    if request.GET.get('product', '').isdigit():
+        sales = sales.filter(product_id=request.GET['product'])
+    if request.GET.get('category'):
+        sales = sales.filter(product__category=request.GET['category'])
     context = {
-        'sales': sales,
+        'sales': keyset_paginate(request, sales, ['-sale_date', '-id']),
+        'categories': Product.CATEGORY_CHOICES,
         'form': form,
         'main_title': 'Sales Dashboard'
     }
     return render(request, 'inventory/sales.html', context)
 
 
+@require_POST
+@api_login_required
+def sales_batch(request):
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'errors': ['Request body must be valid JSON.']}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'errors': ['Request body must be a JSON object.']}, status=400)
+
+    idempotency_key = request.headers.get('Idempotency-Key') or payload.get('idempotency_key')
+    if not idempotency_key:
+        return JsonResponse({'errors': ['An idempotency key is required.']}, status=400)
+
+    try:
+        batch, created = record_sale_batch(request.user, str(idempotency_key)[:255], payload.get('lines'))
+    except ValidationError as error:
+        return JsonResponse({'errors': error.messages}, status=400)
+
+    return JsonResponse({
+        'batch': batch.pk,
+        'idempotency_key': batch.idempotency_key,
+        'sales_count': batch.sales_count,
+        'total_quantity': batch.total_quantity,
+        'total_amount': str(batch.total_amount),
+        'replayed': not created,
+    }, status=201 if created else 200)
+
+
 @login_required(login_url='login')
+def export_sales(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'errors': [f'format must be one of {", ".join(EXPORT_FORMATS)}.']}, status=400)
+    product = request.GET.get('product', '')
+
+    stream, content_type = EXPORT_FORMATS[export_format]
+    # The rows are read while the response streams, after the view has returned, so pick the database now
+    rows = sales_ledger(start_date=_date_param(request, 'start'), end_date=_date_param(request, 'end'),
+                        product_id=int(product) if product.isdigit() else None,
+                        category=request.GET.get('category') or None, using=read_database())
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="sales.{export_format}"'
+    return response
+
+
+@api_login_required
+@reporting_reads()
+def sales_trends(request):
+    bucket = request.GET.get('bucket', 'month')
+    if bucket not in SERIES_BUCKETS:
+        return JsonResponse({'errors': [f'bucket must be one of {", ".join(SERIES_BUCKETS)}.']}, status=400)
+    product = request.GET.get('product', '')
+
+    series = sales_series(bucket, start_date=_date_param(request, 'start'), end_date=_date_param(request, 'end'),
+                          product_id=int(product) if product.isdigit() else None)
+    return JsonResponse({
+        'bucket': bucket,
+        'series': [
+            {'period': row['period'].isoformat(), 'sales_count': row['sales_count'], 'quantity': row['quantity'],
+             'revenue': str(row['revenue'])}
+            for row in series
+        ],
+    })
+
+
+@login_required(login_url='login')
+@reporting_reads()
 def products_listing(request):
     if request.method == 'POST':
         form = ProductForm(request.POST)
@@ -134,9 +276,13 @@ def products_listing(request):
             return redirect(to='products')
     else:
         form = ProductForm()
-    products = Product.objects.all()
+    products = Product.objects.select_related('responsible_user')
+    category = request.GET.get('category')
+    if category:
+        products = products.filter(category=category)
     context = {
-        'products': products,
+        'products': keyset_paginate(request, products, ['name', 'id']),
+        'categories': Product.CATEGORY_CHOICES,
         'form': form,
         'main_title': 'Products Dashboard'
     }
@@ -147,3 +293,146 @@ def products_listing(request):
 def logout_view(request):
     logout(request)
     return redirect(to='login')
+
+
+@user_passes_test(lambda user: user.is_staff, login_url='login')
+def inventory_cache_stats(request):
+    return JsonResponse(cache_stats())
+
+
+def _stock_json(stock):
+    return {
+        'product': stock.product_id,
+        'name': stock.product.name,
+        'quantity': stock.quantity,
+        'low_stock_threshold': stock.low_stock_threshold,
+        'low_stock': stock.is_low_stock(),
+        'version': stock.version,
+        'updated_at': stock.updated_at.isoformat(),
+    }
+
+
+def _stock_ids(request):
+    # None when an id is not a whole number, the view answers 400 rather than serving part of the list
+    try:
+        return [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return None
+
+
+def _since_param(request):
+    try:
+        since = parse_datetime(request.GET.get('since') or '')
+    except ValueError:
+        since = None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def _changed_stock(request):
+    stock = Stock.objects.all()
+    since = _since_param(request)
+    if since is not None:
+        stock = stock.filter(updated_at__gt=since)
+    return stock
+
+
+# The ETag functions read only versions through the stock indexes, so a poll that comes back
+# 304 Not Modified never loads or serializes the stock rows
+
+def _stock_etag(request, product_id):
+    version = Stock.objects.filter(product_id=product_id).values_list('version', flat=True).first()
+    return f'stock-{product_id}-{version}' if version is not None else None
+
+
+def _stock_batch_etag(request):
+    product_ids = _stock_ids(request)
+    if not product_ids or len(product_ids) > getattr(settings, 'INVENTORY_MAX_PAGE_SIZE', 100):
+        return None
+    versions = list(Stock.objects.filter(product_id__in=product_ids).order_by('product_id')
+                    .values_list('product_id', 'version'))
+    return 'stocks-' + hashlib.sha1(json.dumps(versions).encode()).hexdigest()
+
+
+def _stock_changes_etag(request):
+    changes = _changed_stock(request).aggregate(latest=Max('updated_at'), count=Count('id'))
+    fingerprint = f'{request.get_full_path()}|{changes["latest"]}|{changes["count"]}'
+    return 'changes-' + hashlib.sha1(fingerprint.encode()).hexdigest()
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_stock_etag)
+def stock_detail(request, product_id):
+    stock = Stock.objects.select_related('product').filter(product_id=product_id).first()
+    if stock is None:
+        return JsonResponse({'errors': [f'Product {product_id} has no stock.']}, status=404)
+    return JsonResponse(_stock_json(stock))
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_stock_batch_etag)
+def stock_batch(request):
+    product_ids = _stock_ids(request)
+    if not product_ids:
+        return JsonResponse({'errors': ['ids must be a comma separated list of product ids.']}, status=400)
+    max_ids = getattr(settings, 'INVENTORY_MAX_PAGE_SIZE', 100)
+    if len(product_ids) > max_ids:
+        return JsonResponse({'errors': [f'ids takes at most {max_ids} product ids.']}, status=400)
+    stocks = Stock.objects.select_related('product').filter(product_id__in=product_ids).order_by('product_id')
+    return JsonResponse({'results': [_stock_json(stock) for stock in stocks]})
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_stock_changes_etag)
+def stock_changes(request):
+    # Everything changed after ?since=, oldest change first. Clients pass the updated_at of the last row
+    # they saw as the next since, or follow the next link while a burst of changes spans several pages.
+    if request.GET.get('since') and _since_param(request) is None:
+        return JsonResponse({'errors': ['since must be an ISO 8601 timestamp.']}, status=400)
+    page = keyset_paginate(request, _changed_stock(request).select_related('product'), ['updated_at', 'id'])
+    return JsonResponse({'results': [_stock_json(stock) for stock in page], 'next': page.next_link})
+
+
+def _lookup_params(request):
+    # Prefix of at least one character and a small limit, so every lookup is a short range scan of a Lower() index
+    limit = request.GET.get('limit', '')
+    limit = int(limit) if limit.isdigit() else getattr(settings, 'INVENTORY_LOOKUP_LIMIT', 10)
+    return request.GET.get('q', '').strip(), max(1, min(limit, getattr(settings, 'INVENTORY_MAX_PAGE_SIZE', 100)))
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, max_age=10)
+def product_lookup(request):
+    # Typeahead for the product selects, with the current stock so the sale form can show what is left
+    term, limit = _lookup_params(request)
+    if not term:
+        return JsonResponse({'results': []})
+    products = Product.objects.filter(prefix_search('name', term)).order_by(Lower('name'), 'id')
+    if request.GET.get('in_stock'):
+        products = products.filter(stock__quantity__gt=0)
+    products = products.values('id', 'name', 'stock__quantity', 'stock__low_stock_threshold')[:limit]
+    return JsonResponse({'results': [
+        {'id': product['id'], 'text': product['name'], 'quantity': product['stock__quantity'] or 0,
+         'low_stock': (product['stock__quantity'] or 0) <= (product['stock__low_stock_threshold'] or 0)}
+        for product in products
+    ]})
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, max_age=10)
+def user_lookup(request):
+    term, limit = _lookup_params(request)
+    if not term:
+        return JsonResponse({'results': []})
+    users = (User.objects.filter(prefix_search('email', term), is_active=True).order_by(Lower('email'))
+             .values('id', 'email'))
+    return JsonResponse({'results': [{'id': user['id'], 'text': user['email']} for user in users[:limit]]})
@@ -0,0 +1,34 @@
+# inventory/widgets.py
+from urllib.parse import urlencode
+
+from django import forms
+from django.urls import reverse
+
+
+class TypeaheadSelect(forms.Select):
+    # A select for ModelChoiceFields over large tables: only the selected option is rendered, static/js/typeahead.js
+    # fetches the rest from the lookup endpoint as the user types. Validation still runs against the field's queryset.
+    def __init__(self, url_name, params=None, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.params = params or {}
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        url = reverse(self.url_name)
+        if self.params:
+            url = f'{url}?{urlencode(self.params)}'
+        context['widget']['attrs']['data-typeahead'] = url
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [pk for pk in value if str(pk).isdigit()]
+        field = self.choices.field
+        options = [('', field.empty_label or '')]
+        if selected:
+            options += [(obj.pk, field.label_from_instance(obj))
+                        for obj in self.choices.queryset.filter(pk__in=selected)]
+        return [
+            (None, [self.create_option(name, option_value, label, str(option_value) in value, index)], index)
+            for index, (option_value, label) in enumerate(options)
+        ]
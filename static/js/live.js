@@ -0,0 +1,23 @@
+// Keeps the dashboard fresh from the server-sent events stream instead of reloading pages
+(function () {
+  'use strict';
+  if (!window.EventSource || !document.body.dataset.liveEvents) {
+    return;
+  }
+
+  var source = new EventSource(document.body.dataset.liveEvents);
+
+  source.addEventListener('stock', function (message) {
+    var event = JSON.parse(message.data);
+    document.querySelectorAll('[data-stock-product="' + event.product + '"]').forEach(function (badge) {
+      badge.textContent = (event.low_stock ? 'Low stock ~ ' : 'Available~ ') + event.quantity;
+      badge.className = event.low_stock ? 'badge-warning' : 'badge-success';
+    });
+  });
+
+  source.addEventListener('notification', function () {
+    document.querySelectorAll('[data-unread-count]').forEach(function (counter) {
+      counter.textContent = (parseInt(counter.textContent, 10) || 0) + 1;
+    });
+  });
+})();
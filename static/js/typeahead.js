@@ -0,0 +1,73 @@
+// Turns the selects rendered by TypeaheadSelect into a text box that asks the lookup endpoint for matches
+(function () {
+  'use strict';
+
+  function setup(select) {
+    var input = document.createElement('input');
+    var list = document.createElement('ul');
+    var timer = null;
+    var selected = select.options[select.selectedIndex];
+
+    input.type = 'text';
+    input.className = 'form-control';
+    input.autocomplete = 'off';
+    input.placeholder = select.getAttribute('placeholder') || '';
+    input.value = selected && selected.value ? selected.text : '';
+    list.className = 'list-group position-absolute w-100 d-none';
+    list.style.zIndex = 1060;
+
+    var wrapper = document.createElement('div');
+    wrapper.className = 'position-relative ' + select.className.replace(/form-(select|control)/g, '');
+    select.parentNode.insertBefore(wrapper, select);
+    wrapper.appendChild(input);
+    wrapper.appendChild(list);
+    wrapper.appendChild(select);
+    select.hidden = true;
+    // A hidden required select would block the submit without telling the user why
+    input.required = select.required;
+    select.required = false;
+
+    function choose(result) {
+      select.innerHTML = '';
+      select.add(new Option(result.text, result.id, true, true));
+      input.value = result.text;
+      list.classList.add('d-none');
+    }
+
+    function show(results) {
+      list.innerHTML = '';
+      results.forEach(function (result) {
+        var item = document.createElement('li');
+        item.className = 'list-group-item list-group-item-action';
+        item.textContent = result.quantity === undefined ? result.text : result.text + ' (' + result.quantity + ' in stock)';
+        item.addEventListener('mousedown', function (event) {
+          event.preventDefault();
+          choose(result);
+        });
+        list.appendChild(item);
+      });
+      list.classList.toggle('d-none', results.length === 0);
+    }
+
+    input.addEventListener('input', function () {
+      select.innerHTML = '';
+      select.add(new Option('', ''));
+      clearTimeout(timer);
+      var term = input.value.trim();
+      if (!term) {
+        show([]);
+        return;
+      }
+      timer = setTimeout(function () {
+        var url = select.dataset.typeahead;
+        url += (url.indexOf('?') === -1 ? '?' : '&') + 'q=' + encodeURIComponent(term);
+        fetch(url, {credentials: 'same-origin'})
+          .then(function (response) { return response.json(); })
+          .then(function (data) { show(data.results || []); });
+      }, 150);
+    });
+    input.addEventListener('blur', function () { list.classList.add('d-none'); });
+  }
+
+  document.querySelectorAll('select[data-typeahead]').forEach(setup);
+})();